@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AiGeneratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_generator'
+
+    def ready(self):
+        # Build the shared generator model when each worker process starts
+        if settings.LLM_WARMUP and settings.GEMINI_API_KEY:
+            from utils.llm_gateway import get_generative_model
+            from ai_generator.views import GENERATOR_MODEL, SYSTEM_INSTRUCTION
+            try:
+                get_generative_model(GENERATOR_MODEL, system_instruction=SYSTEM_INSTRUCTION)
+            except Exception as e:
+                print(f"Generator model warm-up failed: {e}")
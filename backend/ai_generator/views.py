@@ -1,7 +1,8 @@
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.response import Response
 from django.conf import settings
-import google.generativeai as genai
+from utils.llm_gateway import get_generative_model, call_with_retry, request_options, record_prompt_tokens
+from utils.prompt_builder import PromptBuilder
 import json
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
@@ -9,6 +10,63 @@ import cloudinary.uploader
 
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate, AIMessagePromptTemplate
 
+GENERATOR_MODEL = 'models/gemini-2.5-flash-lite'
+
+SYSTEM_INSTRUCTION = """You are a helpful legal assistant. Your goal is to help the user create a legal document.
+- First, ask follow-up questions to gather all the necessary details.
+- When you have enough information, generate the full legal document.
+- The document **must** be in well-structured **Markdown format**. Use headings (`#`, `##`), lists (`*`, `-`), bold (`**text**`), and italics (`*text`*) to create a professional and readable document.
+- When you are ready to generate the document, provide it in a JSON format like this: ```json{"type": "document", "text": "...your Markdown document here..."}```.
+- If the user asks to update some information, you must look for the previous document you generated in the conversation history. You will use that document as the basis for your new version.
+- You must then regenerate the **entire** document, incorporating the user's requested changes, and provide it again in the same JSON format. Do not just provide the updated line or a confirmation message.
+- **Signature Handling:** If the user uploads a signature, you will see a system message like `(System: The user has uploaded a signature...)` with a URL. When you generate the document, you **must** include this signature at the appropriate signature lines using the provided URL in the correct markdown format: `![Signature](URL)`. **Do NOT acknowledge the system message about the signature upload in your conversational response.**
+"""
+
+# The editor sends its current document as a user message starting with this
+DOCUMENT_CONTEXT_PREFIX = "Here is the legal document we are working on."
+
+
+def _is_document_message(message):
+    return message.get('type') == 'document_context' or message.get('text', '').startswith(DOCUMENT_CONTEXT_PREFIX)
+
+
+def _exchanges(history):
+    """Group history into exchanges: a user message and the model replies that follow it."""
+    exchanges = []
+    for message in history:
+        if message['sender'] == 'user' or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+    return exchanges
+
+
+def _fit_history(history, current_message):
+    """
+    Trim the history to GENERATOR_PROMPT_TOKENS by dropping the oldest
+    exchanges. The exchange carrying the latest version of the document
+    is always kept. Returns the kept messages and the prompt's estimated
+    token count.
+    """
+    exchanges = _exchanges(history)
+    pinned = max((i for i, exchange in enumerate(exchanges) if any(map(_is_document_message, exchange))), default=None)
+    others = [i for i in range(len(exchanges)) if i != pinned]
+
+    def render(i):
+        return "\n".join(f"{message['sender']}: {message['text']}" for message in exchanges[i])
+
+    built = (
+        PromptBuilder(settings.GENERATOR_PROMPT_TOKENS)
+        .add('instructions', SYSTEM_INSTRUCTION, trim=None)
+        .add('message', current_message, trim=None)
+        .add('document', [render(pinned)] if pinned is not None else [], trim=None)
+        .add('history', [render(i) for i in others], trim='start', separator="\n", cut=False)
+        .build()
+    )
+    kept = set(others[len(others) - len(built.items('history')):])
+    if pinned is not None:
+        kept.add(pinned)
+    return [message for i in sorted(kept) for message in exchanges[i]], built.tokens
+
 
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser, JSONParser])
@@ -35,26 +93,13 @@ def chat(request):
             except Exception as e:
                 return Response({'error': f'Error uploading signature: {e}'}, status=500)
 
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-
-        system_instruction_text = """You are a helpful legal assistant. Your goal is to help the user create a legal document.
-- First, ask follow-up questions to gather all the necessary details.
-- When you have enough information, generate the full legal document.
-- The document **must** be in well-structured **Markdown format**. Use headings (`#`, `##`), lists (`*`, `-`), bold (`**text**`), and italics (`*text`*) to create a professional and readable document.
-- When you are ready to generate the document, provide it in a JSON format like this: ```json{"type": "document", "text": "...your Markdown document here..."}```.
-- If the user asks to update some information, you must look for the previous document you generated in the conversation history. You will use that document as the basis for your new version.
-- You must then regenerate the **entire** document, incorporating the user's requested changes, and provide it again in the same JSON format. Do not just provide the updated line or a confirmation message.
-- **Signature Handling:** If the user uploads a signature, you will see a system message like `(System: The user has uploaded a signature...)` with a URL. When you generate the document, you **must** include this signature at the appropriate signature lines using the provided URL in the correct markdown format: `![Signature](URL)`. **Do NOT acknowledge the system message about the signature upload in your conversational response.**
-"""
-
-        model = genai.GenerativeModel(
-            'models/gemini-2.5-flash-lite',
-            system_instruction=system_instruction_text
-        )
+        model = get_generative_model(GENERATOR_MODEL, system_instruction=SYSTEM_INSTRUCTION)
 
-        # Separate history from the current message
-        history = messages[:-1]
+        # Separate history from the current message, keeping only as much
+        # history as fits in the prompt budget
         current_message = messages[-1]['text']
+        history, prompt_tokens = _fit_history(messages[:-1], current_message)
+        record_prompt_tokens('generator.chat', prompt_tokens)
 
         gemini_history = []
         for message in history:
@@ -62,7 +107,12 @@ def chat(request):
             gemini_history.append({'role': role, 'parts': [message['text']]})
 
         chat_session = model.start_chat(history=gemini_history)
-        response = chat_session.send_message(current_message)
+        response = call_with_retry(
+            'generator.chat',
+            chat_session.send_message,
+            current_message,
+            request_options=request_options(),
+        )
 
         print(f"Raw model response object: {response}")
         print(f"Model response text: {response.text}")
@@ -76,10 +126,11 @@ def chat(request):
             # Extract the JSON part from the response
             json_str = response.text.split('```json')[1].split('```')[0]
             document_data = json.loads(json_str)
+            document_data['prompt_tokens'] = prompt_tokens
             return Response(document_data)
         else:
             # It's a question
-            return Response({'type': 'question', 'text': response.text})
+            return Response({'type': 'question', 'text': response.text, 'prompt_tokens': prompt_tokens})
 
     except Exception as e:
         print(f"Error in chat view: {e}")
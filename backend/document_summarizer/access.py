@@ -0,0 +1,52 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from rest_framework import status
+
+from .models import DocumentSession
+
+# Loaded by every ownership check; everything else is loaded on demand
+BASE_FIELDS = ('id', 'user', 'created_at', 'text_storage', 'page_count', 'text_size', 'text_hash')
+
+
+class SessionAccessError(Exception):
+    """Raised when a session does not exist or belongs to another user."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def get_owned_session(session_id, user, *fields):
+    """
+    Return the session if it belongs to user, loading only the base fields
+    plus the given ones.
+
+    Ownership is checked in the query itself, on (_id, user), and the user
+    reference is never dereferenced. A second, id-only query runs only when
+    the first finds nothing, to tell a foreign session (403) from a missing
+    one (404).
+    """
+    try:
+        object_id = ObjectId(session_id)
+    except (InvalidId, TypeError):
+        raise SessionAccessError('Session not found', status.HTTP_404_NOT_FOUND)
+
+    session = (
+        DocumentSession.objects(id=object_id, user=user.id)
+        .only(*BASE_FIELDS, *fields)
+        .no_dereference()
+        .first()
+    )
+    if session:
+        return session
+
+    if DocumentSession.objects(id=object_id).only('id').first():
+        raise SessionAccessError('Access denied', status.HTTP_403_FORBIDDEN)
+    raise SessionAccessError('Session not found', status.HTTP_404_NOT_FOUND)
+
+
+def load_session_fields(session, *fields):
+    """Load heavy fields (summary, legacy inline text) onto a session from get_owned_session."""
+    session.reload(*fields)
+    return session
@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+
+from .cache import extraction_cache, extraction_key
+from .pipeline import extract_text, save_document, DocumentProcessingError
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # Per document, as for single uploads
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+
+def _failed(filename, error):
+    return {'filename': filename, 'status': 'failed', 'error': error}
+
+
+def _check_total(total):
+    if total > settings.BATCH_MAX_TOTAL_SIZE:
+        raise DocumentProcessingError(
+            f'Batch exceeds the {settings.BATCH_MAX_TOTAL_SIZE // (1024 * 1024)}MB total size limit.'
+        )
+
+
+def collect_batch_files(uploads):
+    """
+    Turn uploaded files into (filename, data) pairs, expanding zip archives.
+
+    uploads are Django UploadedFiles. Returns the documents to process and
+    failed results for entries that cannot be (unsupported type, too large,
+    unreadable archive member).
+    Raises DocumentProcessingError when the batch as a whole is invalid.
+    """
+    files, rejected, total = [], [], 0
+    for upload in uploads:
+        if upload.name.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(upload)
+            except zipfile.BadZipFile:
+                rejected.append(_failed(upload.name, 'Invalid zip archive.'))
+                continue
+            with archive:
+                for member in archive.infolist():
+                    basename = os.path.basename(member.filename)
+                    if member.is_dir() or member.filename.startswith('__MACOSX/') or basename.startswith('.'):
+                        continue
+                    if not member.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                        rejected.append(_failed(member.filename, 'Unsupported file type. Please upload PDF, DOCX, or TXT'))
+                        continue
+                    # Sizes are checked from the archive directory before anything is decompressed
+                    if member.file_size > MAX_UPLOAD_SIZE:
+                        rejected.append(_failed(member.filename, 'File size exceeds 10MB limit.'))
+                        continue
+                    total += member.file_size
+                    _check_total(total)
+                    # A corrupt or encrypted member fails on its own, not the whole batch
+                    try:
+                        data = archive.read(member)
+                    except (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError, EOFError) as e:
+                        rejected.append(_failed(member.filename, f'Could not read the file from the archive: {e}'))
+                        continue
+                    files.append((member.filename, data))
+        elif not upload.name.lower().endswith(SUPPORTED_EXTENSIONS):
+            rejected.append(_failed(upload.name, 'Unsupported file type. Please upload PDF, DOCX, or TXT'))
+        elif upload.size > MAX_UPLOAD_SIZE:
+            rejected.append(_failed(upload.name, 'File size exceeds 10MB limit.'))
+        else:
+            total += upload.size
+            _check_total(total)
+            upload.seek(0)
+            files.append((upload.name, upload.read()))
+
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise DocumentProcessingError(f'A batch can contain at most {settings.BATCH_MAX_FILES} documents.')
+    return files, rejected
+
+
+def _extract_in_worker(filename, data):
+    # Each document already has a process of its own, so a PDF's pages are
+    # not split further; a one-process pool still enforces the page timeout
+    return extract_text(filename, data, workers=1)
+
+
+def _summarize(user, filename, text, page_offsets):
+    session = save_document(user, text, page_offsets)
+    return {
+        'filename': filename,
+        'status': 'succeeded',
+        'session_id': str(session.id),
+        'summary': session.summary,
+    }
+
+
+def process_batch(user, files):
+    """
+    Extract, summarize and save many documents, yielding one result dict
+    per file as soon as that file finishes.
+
+    Cache misses are extracted in parallel by a process pool. Each
+    extracted document is handed straight to a thread pool that runs at
+    most BATCH_SUMMARY_CONCURRENCY summarizations at a time, so total time
+    tracks the slowest document rather than the sum of all of them.
+    """
+    if not files:
+        return
+
+    misses = []
+    with ThreadPoolExecutor(
+        max_workers=min(settings.BATCH_SUMMARY_CONCURRENCY, len(files)),
+        thread_name_prefix='batch-summarize',
+    ) as summarizers:
+        pending = {}
+        for filename, data in files:
+            key = extraction_key(data)
+            cached = extraction_cache.get(key)
+            if cached:
+                future = summarizers.submit(_summarize, user, filename, cached.text, cached.page_offsets)
+                pending[future] = ('summarize', filename, None)
+            else:
+                misses.append((filename, data, key))
+
+        extractors = None
+        if misses:
+            # forkserver: the summarizer threads are already running, and
+            # forking a threaded process can deadlock the child
+            extractors = ProcessPoolExecutor(
+                max_workers=min(settings.PDF_EXTRACTION_WORKERS, len(misses)),
+                mp_context=multiprocessing.get_context('forkserver'),
+            )
+        try:
+            for filename, data, key in misses:
+                pending[extractors.submit(_extract_in_worker, filename, data)] = ('extract', filename, key)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, filename, key = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except DocumentProcessingError as e:
+                        yield _failed(filename, str(e))
+                        continue
+                    except Exception as e:
+                        print(f"Error processing {filename} in batch: {e}")
+                        yield _failed(filename, str(e))
+                        continue
+
+                    if stage == 'summarize':
+                        yield result
+                    else:
+                        text, page_offsets = result
+                        extraction_cache.set(key, text=text, page_offsets=page_offsets)
+                        future = summarizers.submit(_summarize, user, filename, text, page_offsets)
+                        pending[future] = ('summarize', filename, None)
+        finally:
+            if extractors:
+                # A client that disconnects mid-batch stops further work
+                extractors.shutdown(wait=False, cancel_futures=True)
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,114 @@
+import hashlib
+import re
+from datetime import datetime
+
+from django.conf import settings
+
+from .models import ExtractionCacheEntry, SummaryCacheEntry, CacheStats
+from .extraction import EXTRACTION_VERSION
+from .summarization import SUMMARY_PROMPT_VERSION, effective_chunk_size
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def extraction_key(data):
+    # The extractor version is part of the key so improved extractors
+    # (such as DOCX tables) are not shadowed by old cached text.
+    return hashlib.sha256(f"{EXTRACTION_VERSION}\n".encode('utf-8') + data).hexdigest()
+
+
+def normalize_text(text):
+    """Collapse whitespace so re-extractions of the same document hash the same."""
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def summary_key(text):
+    # Chunk size (capped by the prompt token budget) changes how long
+    # documents are summarized, so it is part of the key along with the
+    # prompt version.
+    version = f"{SUMMARY_PROMPT_VERSION}:{effective_chunk_size()}"
+    return hashlib.sha256(f"{version}\n{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+def count_outcome(tier, outcome):
+    """Increment a tier's hits or misses counter."""
+    try:
+        CacheStats.objects(tier=tier).update_one(**{f'inc__{outcome}': 1}, upsert=True)
+    except Exception as e:
+        print(f"Error updating {tier} cache stats: {e}")
+
+
+def outcome_stats(tier):
+    counters = CacheStats.objects(tier=tier).first()
+    hits = counters.hits if counters else 0
+    misses = counters.misses if counters else 0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+    }
+
+
+class CacheTier:
+    """
+    One Mongo-backed cache tier.
+
+    Reads refresh last_accessed, which the TTL index uses to expire idle
+    entries; writes evict the least recently used entries once the tier
+    grows past its size limit. Cache failures are logged and treated as
+    misses so they never fail the request.
+    """
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+
+    def get(self, key):
+        """Return the cached entry for key, or None on a miss."""
+        try:
+            entry = self.model.objects(key=key).modify(
+                set__last_accessed=datetime.utcnow(),
+                inc__hits=1,
+            )
+        except Exception as e:
+            print(f"Error reading {self.name} cache: {e}")
+            entry = None
+        count_outcome(self.name, 'hits' if entry else 'misses')
+        return entry
+
+    def set(self, key, **values):
+        try:
+            now = datetime.utcnow()
+            self.model.objects(key=key).update_one(
+                **{f'set__{field}': value for field, value in values.items()},
+                set__last_accessed=now,
+                set_on_insert__created_at=now,
+                upsert=True,
+            )
+            self._evict()
+        except Exception as e:
+            print(f"Error writing {self.name} cache: {e}")
+
+    def _evict(self):
+        collection = self.model._get_collection()
+        overflow = collection.estimated_document_count() - settings.DOCUMENT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale = collection.find({}, {'_id': 1}).sort('last_accessed', 1).limit(overflow)
+            collection.delete_many({'_id': {'$in': [doc['_id'] for doc in stale]}})
+
+    def stats(self):
+        return {
+            **outcome_stats(self.name),
+            'entries': self.model._get_collection().estimated_document_count(),
+        }
+
+
+extraction_cache = CacheTier('extraction', ExtractionCacheEntry)
+summary_cache = CacheTier('summary', SummaryCacheEntry)
+
+
+def cache_stats():
+    stats = {tier.name: tier.stats() for tier in (extraction_cache, summary_cache)}
+    # Summaries reused from a near-duplicate earlier upload (see dedup)
+    stats['near_duplicate'] = outcome_stats('near_duplicate')
+    return stats
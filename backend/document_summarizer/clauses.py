@@ -0,0 +1,177 @@
+"""
+Deterministic clause segmentation of legal documents.
+
+A document is cut into blocks at blank lines and at lines that open a
+clause or section, and each block is classified by how it starts:
+
+    c  clause     "12.", "3.4.1", "Section 2.1", "ARTICLE IV", "(a)"
+    h  heading    a short line of its own, e.g. "DEFINITIONS"
+    r  recital    "WHEREAS ..."
+    s  schedule   "SCHEDULE 1", "Annexure A", "Exhibit B", "Appendix" as a heading line
+    p  paragraph  anything else
+
+Each block gets a stable id: the clause number ("4.2", "4.2(a)"), or the
+kind and a running count ("recital-2", "heading-3", "p-7"). Numbered
+clauses inside a schedule are scoped to it ("schedule-1/3"). The table is
+computed once at upload and stored compactly on the session.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter
+
+# A new block starts at a blank line or at a line that opens a clause or
+# section: "ARTICLE 4", "Section 2.1", "12.", "3.4.1", "(a)", "WHEREAS", ...
+SECTION_BOUNDARY = re.compile(
+    r"\n\s*\n"
+    r"|\n(?=[ \t]*(?:"
+    r"(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|ANNEXURE|Annexure|"
+    r"EXHIBIT|Exhibit|APPENDIX|Appendix)\b"
+    r"|(?:\d{1,3}(?:\.\d{1,3})+|\d{1,3}(?=[.)]))[.)]?[ \t]+\S"
+    r"|\([a-zA-Z0-9]{1,4}\)[ \t]"
+    r"|WHEREAS\b|NOW,? THEREFORE\b"
+    r"))"
+)
+
+SCHEDULE_START = re.compile(
+    r"(?:SCHEDULE|Schedule|ANNEXURE|Annexure|EXHIBIT|Exhibit|APPENDIX|Appendix)\b[ \t]*([A-Z0-9]{1,4}\b)?"
+)
+ARTICLE_START = re.compile(r"(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause)[ \t]+(\d+(?:\.\d+)*|[IVXLC]+)\b")
+# "12.", "4)", "3.4.1": up to three digits per level, and a lone number only
+# with its "." or ")", so "2024 rent ..." or "30 days ..." stay prose
+NUMBER_START = re.compile(r"(\d{1,3}(?:\.\d{1,3})+|\d{1,3}(?=[.)]))[.)]?[ \t]+\S")
+LETTER_START = re.compile(r"\(([a-zA-Z0-9]{1,4})\)[ \t]")
+RECITAL_START = re.compile(r"(?:WHEREAS|Whereas)\b")
+
+CLAUSE_FIELDS = ('clause_ids', 'clause_kinds', 'clause_offsets')
+KINDS = {'c': 'clause', 'h': 'heading', 'r': 'recital', 's': 'schedule', 'p': 'paragraph'}
+HEADING_MAX_LENGTH = 80
+# Lowercase words that may follow "Schedule" in a title ("Schedule of Payments")
+SCHEDULE_TITLE_WORDS = frozenset(('of', 'to', 'for'))
+
+
+def block_spans(text):
+    """(start, end) offsets of the non-blank blocks between boundaries, trimmed of whitespace."""
+    spans, start = [], 0
+    for match in SECTION_BOUNDARY.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for start, end in spans:
+        block = text[start:end]
+        stripped = block.strip()
+        if stripped:
+            block_start = start + len(block) - len(block.lstrip())
+            trimmed.append((block_start, block_start + len(stripped)))
+    return trimmed
+
+
+def _is_heading(block):
+    return (
+        len(block) <= HEADING_MAX_LENGTH
+        and '\n' not in block
+        and block[0].isupper()
+        and not block.endswith(('.', ';', ',', ':'))
+    )
+
+
+def _schedule_start(block):
+    """
+    The SCHEDULE_START match of a block that opens a schedule, or None.
+
+    The schedule title must be a short heading line of its own ("SCHEDULE 1",
+    "Annexure B - Payment Terms"), so prose that merely starts with one of
+    the words ("Schedule text ...", "Exhibit A shall ...") does not count.
+    """
+    match = SCHEDULE_START.match(block)
+    if not match or not _is_heading(block.split('\n', 1)[0].rstrip()):
+        return None
+    rest = block[match.end():].split('\n', 1)[0].strip()
+    if rest[:1].islower() and rest.split(None, 1)[0] not in SCHEDULE_TITLE_WORDS:
+        return None
+    return match
+
+
+def segment_clauses(text):
+    """
+    Segment text into clauses, returned as (id, kind, start, end) tuples in
+    document order, with kind one of the KINDS codes.
+    """
+    clauses = []
+    counts = Counter()
+    seen = Counter()
+    schedule = None  # Id of the schedule numbered clauses currently belong to
+    parent = None  # Id of the last numbered clause, for "(a)" sub-clauses
+
+    for start, end in block_spans(text):
+        block = text[start:end]
+        match = _schedule_start(block)
+        if match:
+            kind = 's'
+            counts[kind] += 1
+            clause_id = schedule = f"schedule-{match.group(1) or counts[kind]}"
+            parent = None
+        elif RECITAL_START.match(block):
+            kind = 'r'
+            counts[kind] += 1
+            clause_id = f"recital-{counts[kind]}"
+        elif ARTICLE_START.match(block) or NUMBER_START.match(block):
+            kind = 'c'
+            number = (ARTICLE_START.match(block) or NUMBER_START.match(block)).group(1)
+            clause_id = parent = f"{schedule}/{number}" if schedule else number
+        elif LETTER_START.match(block):
+            kind = 'c'
+            letter = LETTER_START.match(block).group(1)
+            clause_id = f"{parent}({letter})" if parent else f"({letter})"
+        elif _is_heading(block):
+            kind = 'h'
+            counts[kind] += 1
+            clause_id = f"heading-{counts[kind]}"
+        else:
+            kind = 'p'
+            counts[kind] += 1
+            clause_id = f"p-{counts[kind]}"
+
+        # Repeated numbers (two "1." lists) stay addressable as "1~2", "1~3", ...
+        seen[clause_id] += 1
+        if seen[clause_id] > 1:
+            clause_id = f"{clause_id}~{seen[clause_id]}"
+        clauses.append((clause_id, kind, start, end))
+    return clauses
+
+
+def clause_spans(clauses):
+    return [(start, end) for _, _, start, end in clauses]
+
+
+def clause_table(clauses):
+    """The compact form stored on DocumentSession: ids, one kind letter per clause, flat offsets."""
+    return {
+        'clause_ids': [clause_id for clause_id, _, _, _ in clauses],
+        'clause_kinds': "".join(kind for _, kind, _, _ in clauses),
+        'clause_offsets': [offset for _, _, start, end in clauses for offset in (start, end)],
+    }
+
+
+def stored_clauses(session):
+    """A session's clause table as (id, kind, start, end) tuples, or None if it has none."""
+    if session.clause_ids is None or session.clause_kinds is None:
+        return None
+    offsets = session.clause_offsets or []
+    return [
+        (clause_id, kind, offsets[2 * i], offsets[2 * i + 1])
+        for i, (clause_id, kind) in enumerate(zip(session.clause_ids, session.clause_kinds))
+    ]
+
+
+def clauses_in_range(clauses, start, end):
+    """Ids of the clauses overlapping [start, end)."""
+    starts = [clause_start for _, _, clause_start, _ in clauses]
+    ids = []
+    for clause_id, _, clause_start, clause_end in clauses[max(0, bisect_right(starts, start) - 1):]:
+        if clause_start >= end:
+            break
+        if clause_end > start:
+            ids.append(clause_id)
+    return ids
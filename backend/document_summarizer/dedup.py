@@ -0,0 +1,139 @@
+"""
+Near-duplicate detection for uploads.
+
+Each document gets a MinHash signature over word shingles, indexed per
+user with locality-sensitive hashing: the signature is cut into bands and
+two documents become candidates when any band matches exactly. Candidates
+are then checked against the estimated Jaccard similarity, so the band
+layout only affects recall, while DEDUP_THRESHOLD decides what counts as
+a near duplicate.
+
+Long documents are signed over a sample of their shingles, the
+DEDUP_MAX_SHINGLES smallest hashes. The sample is chosen by hash value, so
+two near-identical documents sample nearly the same shingles, and signing
+a 300-page contract costs no more than signing a short one.
+"""
+import hashlib
+import heapq
+import random
+import re
+import zlib
+
+from django.conf import settings
+
+from .models import MinHashSignature
+from .clauses import block_spans
+
+WORD = re.compile(r"\w+")
+WHITESPACE = re.compile(r"\s+")
+
+# Hash permutations h(x) = (a * x + b) mod MERSENNE_PRIME, truncated to 32 bits
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(count):
+    # Fixed seed: signatures must be comparable across processes and deploys
+    rng = random.Random(1)
+    return [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(count)]
+
+
+_PERMUTATIONS = {}
+
+
+def shingle_hashes(text, size=None):
+    """CRC32 hashes of the distinct word size-grams of text, lowercased."""
+    size = size or settings.DEDUP_SHINGLE_SIZE
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode('utf-8'))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash(text, num_perm=None):
+    """MinHash signature of text: the minimum of each hash permutation over its shingles."""
+    num_perm = num_perm or settings.DEDUP_NUM_PERM
+    permutations = _PERMUTATIONS.get(num_perm)
+    if permutations is None:
+        permutations = _PERMUTATIONS[num_perm] = _permutations(num_perm)
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return [MAX_HASH] * num_perm
+    if len(hashes) > settings.DEDUP_MAX_SHINGLES:
+        hashes = heapq.nsmallest(settings.DEDUP_MAX_SHINGLES, hashes)
+    return [min(((a * x + b) % MERSENNE_PRIME) & MAX_HASH for x in hashes) for a, b in permutations]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the documents behind two signatures."""
+    if not signature or len(signature) != len(other):
+        return 0.0
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+def band_keys(signature, bands=None):
+    """One key per LSH band; documents sharing any key are candidates."""
+    bands = bands or settings.DEDUP_BANDS
+    rows = len(signature) // bands
+    return [
+        f"{band}:" + hashlib.blake2b(
+            ",".join(map(str, signature[band * rows:(band + 1) * rows])).encode('ascii'),
+            digest_size=8,
+        ).hexdigest()
+        for band in range(bands)
+    ]
+
+
+def index_signature(session, signature):
+    """Add a saved session's signature to its user's LSH index."""
+    MinHashSignature(
+        session=session,
+        user=session.user,
+        signature=signature,
+        bands=band_keys(signature),
+    ).save()
+
+
+def find_near_duplicate(user, signature, threshold=None):
+    """
+    The id of the user's most similar earlier session with a similarity of
+    at least threshold, and that similarity; (None, 0.0) when there is none.
+    """
+    threshold = settings.DEDUP_THRESHOLD if threshold is None else threshold
+    candidates = (
+        MinHashSignature.objects(user=user.id, bands__in=band_keys(signature))
+        .only('session', 'signature')
+        .no_dereference()
+    )
+    best, best_similarity = None, 0.0
+    for candidate in candidates:
+        score = similarity(signature, candidate.signature)
+        if score >= threshold and score > best_similarity:
+            best, best_similarity = candidate.session.id, score
+    return best, best_similarity
+
+
+def _normalize(block):
+    return WHITESPACE.sub(" ", block).strip()
+
+
+def clause_changes(base_text, text, base_spans=None, spans=None):
+    """
+    Clauses of text that do not appear in base_text (added or edited), and
+    clauses of base_text that no longer appear in text, each in document
+    order. Clauses are compared after collapsing whitespace; their spans
+    are used when already known.
+    """
+    if base_spans is None:
+        base_spans = block_spans(base_text)
+    if spans is None:
+        spans = block_spans(text)
+    base_blocks = [_normalize(base_text[start:end]) for start, end in base_spans]
+    blocks = [_normalize(text[start:end]) for start, end in spans]
+    base_set, new_set = set(base_blocks), set(blocks)
+    added = [block for block in blocks if block and block not in base_set]
+    removed = [block for block in base_blocks if block and block not in new_set]
+    return added, removed
@@ -0,0 +1,291 @@
+import multiprocessing
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from io import BytesIO
+from xml.etree.ElementTree import iterparse, ParseError
+
+import fitz  # PyMuPDF for PDF
+from django.conf import settings
+
+# Bump whenever extraction output changes so cached extractions are not reused
+EXTRACTION_VERSION = "2"
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P, W_T, W_TAB, W_BR, W_CR, W_TR, W_TC = (
+    f"{WORD_NAMESPACE}{tag}" for tag in ('p', 't', 'tab', 'br', 'cr', 'tr', 'tc')
+)
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a batch of pages takes longer than its timeout to extract."""
+
+
+# Long-lived extraction pools by size, created on first use in each process.
+# forkserver workers start from a clean single-threaded server process rather
+# than forking the threaded web or job worker they serve.
+_pools = {}
+_pools_lock = threading.Lock()
+
+# A pool is shared by every request in the process, so a batch may wait
+# behind other requests' batches. Workers report each task they pick up
+# on their pool's queue, and a batch's timeout only runs from then on.
+_start_queues = {}  # pool -> queue its workers report started tasks on
+_started = {}  # task token -> time.monotonic() when it was seen to start
+_waiting = set()  # tokens of tasks whose callers are still waiting
+_started_lock = threading.Lock()
+_worker_start_queue = None
+
+# How often a waiting caller checks whether its batch has started or timed out
+POLL_INTERVAL = 0.5
+
+
+def _init_worker(start_queue):
+    global _worker_start_queue
+    _worker_start_queue = start_queue
+
+
+def _get_pool(processes):
+    with _pools_lock:
+        pool = _pools.get(processes)
+        if pool is None:
+            context = multiprocessing.get_context('forkserver')
+            start_queue = context.SimpleQueue()
+            pool = _pools[processes] = context.Pool(
+                processes=processes, initializer=_init_worker, initargs=(start_queue,)
+            )
+            _start_queues[pool] = start_queue
+        return pool
+
+
+def _discard_pool(processes, pool):
+    """Terminate a pool with a stuck worker; the next extraction starts a new one."""
+    with _pools_lock:
+        if _pools.get(processes) is pool:
+            del _pools[processes]
+        _start_queues.pop(pool, None)
+    pool.terminate()
+
+
+def _started_at(pool, token):
+    """When the task with this token started on the pool, or None while it is still queued."""
+    start_queue = _start_queues.get(pool)
+    with _started_lock:
+        now = time.monotonic()
+        while start_queue is not None and not start_queue.empty():
+            started = start_queue.get()
+            # Tasks of callers that gave up are not tracked
+            if started in _waiting:
+                _started[started] = now
+        return _started.get(token)
+
+
+def _forget(tokens):
+    with _started_lock:
+        for token in tokens:
+            _waiting.discard(token)
+            _started.pop(token, None)
+
+
+def _submit(pool, path, ranges):
+    """Queue the page ranges on the pool; returns the result iterator and one token per range."""
+    tokens = [uuid.uuid4().hex for _ in ranges]
+    with _started_lock:
+        _waiting.update(tokens)
+    results = pool.imap(_extract_page_range, [(path, start, stop, token) for (start, stop), token in zip(ranges, tokens)])
+    return results, tokens
+
+
+def _extract_page_range(task):
+    """Extract the text of pages [start, stop) of the PDF at path inside a worker process."""
+    path, start, stop, token = task
+    _worker_start_queue.put(token)
+    with fitz.open(path, filetype="pdf") as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+
+def _page_ranges(page_count, batch_size):
+    return [
+        (start, min(start + batch_size, page_count))
+        for start in range(0, page_count, batch_size)
+    ]
+
+
+def iter_pdf_pages(data, workers=None, page_timeout=None, batch_size=None, parallel_min_pages=None):
+    """
+    Yield the text of each page of a PDF, in page order.
+
+    Pages are always extracted by a long-lived pool of ``workers`` processes,
+    so that a page taking longer than ``page_timeout`` seconds raises
+    ExtractionTimeout instead of hanging the caller. The timeout runs from
+    when a worker picks a batch up, not while it waits behind other
+    requests' batches in the shared pool. Small documents (and
+    any document when workers is 1) are read by one worker in one go;
+    larger ones are split into page batches that are extracted in parallel,
+    with results streamed back in order as soon as each batch is ready. A
+    timed-out pool is terminated and replaced.
+    """
+    workers = workers or settings.PDF_EXTRACTION_WORKERS
+    page_timeout = page_timeout or settings.PDF_EXTRACTION_PAGE_TIMEOUT
+    batch_size = batch_size or settings.PDF_EXTRACTION_BATCH_SIZE
+    if parallel_min_pages is None:
+        parallel_min_pages = settings.PDF_PARALLEL_MIN_PAGES
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page_count = doc.page_count
+    if not page_count:
+        return
+    if workers <= 1 or page_count < parallel_min_pages:
+        ranges = [(0, page_count)]
+    else:
+        ranges = _page_ranges(page_count, batch_size)
+
+    # Workers read the file from disk, so only page ranges cross the pipe
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf:
+        pdf.write(data)
+        pdf.flush()
+        pool = _get_pool(workers)
+        results, tokens = _submit(pool, pdf.name, ranges)
+        try:
+            while ranges:
+                start, stop = ranges[0]
+                try:
+                    texts = results.next(timeout=min(POLL_INTERVAL, page_timeout))
+                except multiprocessing.TimeoutError:
+                    if _pools.get(workers) is not pool:
+                        # Another extraction timed out and replaced the shared
+                        # pool under us: run what is left on the new one
+                        _forget(tokens)
+                        pool = _get_pool(workers)
+                        results, tokens = _submit(pool, pdf.name, ranges)
+                        continue
+                    started_at = _started_at(pool, tokens[0])
+                    # Time spent queued behind other requests does not count
+                    if started_at is None or time.monotonic() - started_at < page_timeout * (stop - start):
+                        continue
+                    _discard_pool(workers, pool)
+                    raise ExtractionTimeout(
+                        f"Timed out extracting pages {start + 1}-{stop} "
+                        f"(limit {page_timeout}s per page)"
+                    )
+                ranges.pop(0)
+                _forget([tokens.pop(0)])
+                yield from texts
+        finally:
+            _forget(tokens)
+
+
+def extract_pdf_text(data, **kwargs):
+    """Extract the full text of a PDF, joining the page texts once at the end."""
+    return "".join(iter_pdf_pages(data, **kwargs))
+
+
+def iter_docx_blocks(data):
+    """
+    Yield the text of a DOCX body in reading order: one item per paragraph
+    and one per table row, with the row's cells separated by " | ".
+
+    word/document.xml is parsed incrementally straight from the zip, and
+    each top-level paragraph or table is discarded once it has been
+    emitted, so memory stays bounded by the largest single block rather
+    than the whole document. Tables nested in a cell are flattened into
+    that cell's text.
+    """
+    with zipfile.ZipFile(BytesIO(data)) as archive, archive.open('word/document.xml') as xml:
+        depth = 0
+        body = None
+        paragraphs = []  # Text parts of each open paragraph (text boxes nest them)
+        cells = []  # Paragraph texts of each open table cell
+        rows = []  # Cell texts of each open table row
+        for event, element in iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2:
+                    body = element
+                elif element.tag == W_P:
+                    paragraphs.append([])
+                elif element.tag == W_TR:
+                    rows.append([])
+                elif element.tag == W_TC:
+                    cells.append([])
+                continue
+
+            depth -= 1
+            tag = element.tag
+            block = None
+            if not paragraphs and tag in (W_T, W_TAB, W_BR, W_CR):
+                pass  # Runs outside a paragraph (never in valid documents)
+            elif tag == W_T:
+                paragraphs[-1].append(element.text or "")
+            elif tag == W_TAB:
+                paragraphs[-1].append("\t")
+            elif tag in (W_BR, W_CR):
+                paragraphs[-1].append("\n")
+            elif tag == W_P:
+                text = "".join(paragraphs.pop())
+                if paragraphs:
+                    paragraphs[-1].append(text)
+                elif cells:
+                    cells[-1].append(text)
+                else:
+                    block = text
+            elif tag == W_TC:
+                text = " ".join(part for part in cells.pop() if part)
+                rows[-1].append(text)
+            elif tag == W_TR:
+                text = " | ".join(rows.pop())
+                if cells:
+                    cells[-1].append(text)
+                else:
+                    block = text
+
+            if block is not None:
+                yield block
+            if depth == 2 and body is not None:
+                # A top-level block has ended; drop it from the tree
+                body.clear()
+
+
+def extract_docx_text(data):
+    """Extract the full text of a DOCX, one line per paragraph or table row."""
+    return "\n".join(iter_docx_blocks(data))
+
+
+def join_pages(pages):
+    """Join page texts into the full text and the start offset of each page."""
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page)
+    return "".join(pages), offsets
+
+
+def extract_pages(filename, data, **pdf_options):
+    """
+    Extract text from the raw bytes of an upload, depending on file type.
+
+    Returns the text of each page (a single item for DOCX and TXT, which
+    have no fixed pages), or None for unsupported or unreadable files.
+    pdf_options are passed on to iter_pdf_pages.
+    """
+    if filename.endswith('.pdf'):
+        try:
+            return list(iter_pdf_pages(data, **pdf_options))
+        except fitz.FileDataError:
+            return None
+        except Exception as e:
+            raise Exception(f"Error extracting text from PDF: {str(e)}")
+
+    elif filename.endswith('.docx'):
+        try:
+            return [extract_docx_text(data)]
+        except (zipfile.BadZipFile, KeyError, ParseError):
+            return None
+
+    elif filename.endswith('.txt'):
+        return [data.decode('utf-8')]
+
+    else:
+        return None
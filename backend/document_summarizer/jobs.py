@@ -0,0 +1,109 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .models import SummarizationJob
+from .pipeline import process_document, DocumentProcessingError
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobLost(Exception):
+    """Raised in a worker whose job was re-queued or claimed by another worker."""
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SUMMARY_JOB_WORKERS,
+                thread_name_prefix='summarization-job',
+            )
+        return _executor
+
+
+def _claim(job_id=None):
+    """
+    Atomically move a queued job to running so only one worker picks it up,
+    starting a new attempt.
+    """
+    query = {'status': 'queued'}
+    if job_id is not None:
+        query['id'] = job_id
+    return SummarizationJob.objects(**query).order_by('created_at').modify(
+        set__status='running',
+        set__updated_at=datetime.utcnow(),
+        inc__attempt=1,
+        new=True,
+    )
+
+
+def _update(job, **fields):
+    """
+    Update a running job, but only while job is still its current attempt.
+    Returns False once the job was re-queued or claimed by another worker.
+    """
+    fields['updated_at'] = datetime.utcnow()
+    return bool(
+        SummarizationJob.objects(id=job.id, attempt=job.attempt, status='running')
+        .update_one(**{f'set__{name}': value for name, value in fields.items()})
+    )
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording its stage and outcome."""
+    def on_progress(stage, progress):
+        # Every progress report is also the job's heartbeat
+        if not _update(job, stage=stage, progress=progress):
+            raise JobLost(f"Job {job.id} attempt {job.attempt} was taken over by another worker")
+
+    try:
+        session = process_document(job.user, job.filename, job.upload, on_progress=on_progress)
+    except DocumentProcessingError as e:
+        _update(job, status='failed', error=str(e), upload=None)
+    except Exception as e:
+        print(f"Error running summarization job {job.id}: {e}")
+        _update(job, status='failed', error=str(e), upload=None)
+    else:
+        if not _update(job, status='succeeded', stage='done', progress=1.0, session=session, upload=None):
+            print(f"Summarization job {job.id} attempt {job.attempt} finished after being taken over")
+
+
+def _run_queued(job_id):
+    job = _claim(job_id)
+    if job:
+        run_job(job)
+
+
+def submit_job(user, filename, data):
+    """Queue a document for background summarization and return the job."""
+    job = SummarizationJob(user=user, filename=filename, upload=data)
+    job.save()
+    _get_executor().submit(_run_queued, job.id)
+    return job
+
+
+def run_pending_jobs():
+    """
+    Claim and run queued jobs until none are left, first re-queueing jobs
+    whose worker died mid-run: running jobs report progress after every LLM
+    call, so one without a heartbeat for SUMMARY_JOB_STALE_AFTER is not
+    being worked on. Returns the number of jobs run.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.SUMMARY_JOB_STALE_AFTER)
+    SummarizationJob.objects(status='running', updated_at__lt=stale_before).update(
+        set__status='queued',
+        set__stage='queued',
+        set__progress=0.0,
+    )
+    count = 0
+    while True:
+        job = _claim()
+        if not job:
+            return count
+        run_job(job)
+        count += 1
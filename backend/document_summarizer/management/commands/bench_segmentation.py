@@ -0,0 +1,56 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_summarizer.clauses import segment_clauses, clause_spans, KINDS
+from document_summarizer.pipeline import extract_text, DocumentProcessingError
+from document_summarizer.retrieval import passage_spans
+from document_summarizer.summarization import split_into_chunks
+
+
+class Command(BaseCommand):
+    help = "Benchmark clause segmentation (pages/sec) and the downstream steps that reuse its spans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='PDF, DOCX or TXT file to segment')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per step; best run is reported')
+
+    def _best_time(self, func, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            with open(path, 'rb') as f:
+                text, page_offsets = extract_text(path, f.read())
+        except (OSError, DocumentProcessingError) as e:
+            raise CommandError(str(e))
+
+        repeat = max(1, options['repeat'])
+        pages = len(page_offsets)
+        segment_time, clauses = self._best_time(lambda: segment_clauses(text), repeat)
+        spans = clause_spans(clauses)
+
+        kinds = Counter(kind for _, kind, _, _ in clauses)
+        self.stdout.write(f"{pages} pages, {len(text)} characters, best of {repeat} runs")
+        self.stdout.write(
+            f"segmentation: {segment_time:.4f}s ({pages / segment_time:.1f} pages/sec), {len(clauses)} clauses "
+            f"({', '.join(f'{count} {KINDS[kind]}' for kind, count in kinds.most_common())})"
+        )
+
+        # Chunking and passage building, re-parsing the text versus reusing the spans
+        reparse_time, _ = self._best_time(lambda: (split_into_chunks(text), passage_spans(text)), repeat)
+        reuse_time, _ = self._best_time(
+            lambda: (split_into_chunks(text, spans=spans), passage_spans(text, spans=spans)),
+            repeat,
+        )
+        self.stdout.write(
+            f"chunking + passages: {reparse_time:.4f}s re-parsing, {reuse_time:.4f}s reusing spans"
+        )
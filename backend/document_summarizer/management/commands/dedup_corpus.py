@@ -0,0 +1,118 @@
+import os
+import random
+import re
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from document_summarizer.dedup import minhash, similarity, band_keys, shingle_hashes, clause_changes
+from document_summarizer.pipeline import extract_text, DocumentProcessingError
+from document_summarizer.summarization import effective_chunk_size
+
+DATE = re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b(?:January|February|March|April|May|June|July|August|"
+                  r"September|October|November|December) \d{1,2}, \d{4}\b")
+AMOUNT = re.compile(r"(?:[$€£₹]|Rs\.? ?)\d[\d,]*(?:\.\d+)?")
+MONTHS = ("January", "February", "March", "April", "May", "June", "July", "August",
+          "September", "October", "November", "December")
+
+
+def _variant(template, names, rng):
+    """A copy of template with its dates, amounts and the given names changed."""
+    text = DATE.sub(lambda m: f"{rng.choice(MONTHS)} {rng.randint(1, 28)}, {rng.randint(2015, 2026)}", template)
+    text = AMOUNT.sub(lambda m: f"${rng.randint(1, 500) * 1000:,}", text)
+    for name in names:
+        text = text.replace(name, f"{rng.choice(('Alpha', 'Beta', 'Gamma', 'Delta'))} {rng.choice(('Holdings', 'LLP', 'Ltd'))}")
+    return text
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a corpus of documents through near-duplicate detection, in order and "
+        "without the database or the LLM, and report how many summaries would be reused."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory of PDF/DOCX/TXT documents, or a template with --variants')
+        parser.add_argument('--variants', type=int, default=0,
+                            help='Treat path as a template and synthesize this many variants of it')
+        parser.add_argument('--names', default='', help='Comma-separated party names to vary in synthesized variants')
+        parser.add_argument('--threshold', type=float, action='append',
+                            help='Similarity threshold to evaluate; repeatable (default: DEDUP_THRESHOLD)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _load(self, options):
+        path = options['path']
+        if options['variants']:
+            filename = os.path.basename(path)
+            with open(path, 'rb') as f:
+                template, _ = extract_text(filename, f.read())
+            rng = random.Random(options['seed'])
+            names = [name.strip() for name in options['names'].split(',') if name.strip()]
+            return [(f"{filename}#{i}", _variant(template, names, rng)) for i in range(options['variants'])]
+
+        if not os.path.isdir(path):
+            raise CommandError(f"{path} is not a directory (use --variants to synthesize from a template)")
+        documents = []
+        for filename in sorted(os.listdir(path)):
+            with open(os.path.join(path, filename), 'rb') as f:
+                data = f.read()
+            try:
+                text, _ = extract_text(filename, data)
+            except DocumentProcessingError as e:
+                self.stderr.write(f"Skipping {filename}: {e}")
+                continue
+            documents.append((filename, text))
+        return documents
+
+    def handle(self, *args, **options):
+        try:
+            documents = self._load(options)
+        except (OSError, DocumentProcessingError) as e:
+            raise CommandError(str(e))
+        if not documents:
+            raise CommandError("No documents to replay")
+
+        started = time.perf_counter()
+        signatures = [minhash(text) for _, text in documents]
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{len(documents)} documents, signatures in {elapsed:.2f}s "
+            f"({len(documents) / elapsed:.1f} documents/sec)"
+        )
+
+        max_changed = effective_chunk_size()
+        for threshold in options['threshold'] or [settings.DEDUP_THRESHOLD]:
+            buckets = defaultdict(list)
+            reused, changed_chars, total_chars, errors = 0, 0, 0, []
+            for number, ((_, text), signature) in enumerate(zip(documents, signatures)):
+                keys = band_keys(signature)
+                candidates = {other for key in keys for other in buckets[key]}
+                best, best_similarity = None, 0.0
+                for other in candidates:
+                    score = similarity(signature, signatures[other])
+                    if score >= threshold and score > best_similarity:
+                        best, best_similarity = other, score
+                total_chars += len(text)
+                if best is not None:
+                    added, removed = clause_changes(documents[best][1], text)
+                    changed = sum(map(len, added + removed))
+                    if changed <= max_changed:
+                        reused += 1
+                        changed_chars += changed
+                        # How far the MinHash estimate is from the exact shingle Jaccard
+                        own, other = shingle_hashes(text), shingle_hashes(documents[best][1])
+                        errors.append(abs(best_similarity - len(own & other) / len(own | other)))
+                    else:
+                        changed_chars += len(text)
+                else:
+                    changed_chars += len(text)
+                for key in keys:
+                    buckets[key].append(number)
+
+            self.stdout.write(
+                f"threshold {threshold:.2f}: {reused}/{len(documents)} summaries reused "
+                f"({reused / len(documents):.1%}), LLM input {changed_chars / total_chars:.1%} of full summarization"
+                + (f", mean similarity error {sum(errors) / len(errors):.3f}" if errors else "")
+            )
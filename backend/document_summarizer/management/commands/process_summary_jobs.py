@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from document_summarizer.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued summarization jobs, including ones left behind by a crashed web worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f"Processed {count} job(s)")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
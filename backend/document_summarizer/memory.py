@@ -0,0 +1,117 @@
+import re
+
+from django.conf import settings
+
+from .models import DocumentSession, ChatMessage
+
+MEMORY_FIELDS = ('memory_summary', 'memory_window', 'memory_version')
+
+FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.S)
+
+# Attempts at the compare-and-set update before giving up on a busy session
+MAX_UPDATE_ATTEMPTS = 5
+
+
+def _speaker(entry):
+    return 'User' if entry['is_user'] else 'Assistant'
+
+
+def _compress(entry):
+    """One short line standing in for a message that left the window."""
+    text = " ".join(entry['message'].split())
+    match = FIRST_SENTENCE.match(text)
+    text = match.group(1) if match else text
+    limit = settings.CHAT_MEMORY_LINE_CHARS
+    if len(text) > limit:
+        text = text[:limit].rstrip() + '...'
+    return f"{_speaker(entry)}: {text}"
+
+
+def _fold(summary, evicted):
+    """Append evicted messages to the running summary, dropping its oldest lines past the size cap."""
+    lines = [line for line in (summary or '').split("\n") if line]
+    lines.extend(_compress(entry) for entry in evicted)
+    while lines and sum(len(line) + 1 for line in lines) > settings.CHAT_MEMORY_SUMMARY_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def _advance(summary, window, new_entries):
+    window = list(window or []) + new_entries
+    size = settings.CHAT_MEMORY_WINDOW
+    # window[:-0] would evict nothing; a window of zero keeps only the summary
+    if size <= 0:
+        return _fold(summary, window), []
+    evicted, window = window[:-size], window[-size:]
+    return _fold(summary, evicted), window
+
+
+def _bootstrap(session):
+    """Seed the memory of a session that has none yet from its most recent messages."""
+    # limit(0) means no limit to MongoDB
+    if settings.CHAT_MEMORY_WINDOW <= 0:
+        return []
+    recent = list(
+        ChatMessage.objects(session=session)
+        .order_by('-created_at', '-id')
+        .only('message', 'is_user')
+        .limit(settings.CHAT_MEMORY_WINDOW)
+    )
+    return [{'is_user': msg.is_user, 'message': msg.message} for msg in reversed(recent)]
+
+
+def conversation_context(session, exclude_latest_user_message=None):
+    """
+    Earlier conversation for the chat prompt: the running summary of
+    older turns followed by the most recent messages verbatim.
+
+    Uses the memory already loaded on the session, so no history query
+    runs except once for sessions that predate the memory.
+    """
+    summary, window = session.memory_summary, session.memory_window
+    if not session.memory_version:
+        window = _bootstrap(session)
+        # The question being answered was already saved; it goes in the prompt separately
+        if window and exclude_latest_user_message is not None and window[-1]['is_user'] \
+                and window[-1]['message'] == exclude_latest_user_message:
+            window = window[:-1]
+        summary, window = _advance(summary, [], window)
+        session.memory_window = window
+        session.memory_summary = summary
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation:\n{summary}")
+    if window:
+        parts.append("\n".join(f"{_speaker(entry)}: {entry['message']}" for entry in window))
+    return "\n\n".join(parts)
+
+
+def record_exchange(session, user_message, ai_message):
+    """
+    Add a question and answer to the session's memory.
+
+    The update is a compare-and-set on memory_version, so concurrent
+    exchanges on the same session never overwrite each other; on conflict
+    the memory is re-read and the exchange applied again.
+    """
+    new_entries = [
+        {'is_user': True, 'message': user_message},
+        {'is_user': False, 'message': ai_message},
+    ]
+    current = session
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        summary, window = _advance(current.memory_summary, current.memory_window, new_entries)
+        # Sessions from before the memory existed have no version field at all
+        version = current.memory_version or 0
+        version_filter = {'memory_version': version} if version else {'memory_version__in': [0, None]}
+        updated = DocumentSession.objects(id=session.id, **version_filter).update_one(
+            set__memory_summary=summary,
+            set__memory_window=window,
+            inc__memory_version=1,
+        )
+        if updated:
+            return
+        current = DocumentSession.objects(id=session.id).only(*MEMORY_FIELDS).first()
+        if current is None:
+            return
+    print(f"Gave up updating chat memory for session {session.id} after {MAX_UPDATE_ATTEMPTS} attempts")
@@ -1,39 +1,207 @@
-from mongoengine import Document, StringField, DateTimeField, BooleanField, ReferenceField
+from mongoengine import Document, StringField, DateTimeField, BooleanField, ReferenceField, IntField, FloatField, BinaryField, ListField, DictField, CASCADE
 from datetime import datetime
+from django.conf import settings
 from authentication.models import User
+from utils.fields import CompressedStringField
+
+SUMMARY_PREVIEW_LENGTH = 150
+DOCUMENT_PREVIEW_LENGTH = 100
+
+def make_preview(text, length):
+    """Leading characters of text, with an ellipsis when it was cut."""
+    return text[:length] + '...' if len(text) > length else text
 
 class DocumentSession(Document):
     """Document session for storing uploaded documents and their summaries"""
     user = ReferenceField(User, required=True)
-    document_text = StringField(required=True)
-    summary = StringField(required=True)
+    # Sessions created before out-of-line storage keep their text here;
+    # newer ones store it compressed in DocumentTextPage (text_storage='pages')
+    document_text = CompressedStringField()
+    text_storage = StringField(choices=('inline', 'pages'), default='inline')
+    page_count = IntField()
+    text_size = IntField()  # Characters
+    text_hash = StringField()  # SHA-256 of the text
+    # Clause table computed once at upload (see clauses.segment_clauses):
+    # clause ids, one kind letter per clause and flat [start, end, ...] offsets
+    clause_ids = ListField(StringField())
+    clause_kinds = StringField()
+    clause_offsets = ListField(IntField())
+    summary = CompressedStringField(required=True)
+    # Precomputed at write time so session listings never read the full texts
+    summary_preview = StringField()
+    document_preview = StringField()
+    # Rolling chat memory: compressed older turns plus the latest messages
+    # verbatim, updated with a compare-and-set on memory_version
+    memory_summary = StringField(default='')
+    memory_window = ListField(DictField())
+    memory_version = IntField(default=0)
     created_at = DateTimeField(default=datetime.utcnow)
     
     meta = {
         'collection': 'document_sessions',
         'indexes': [
             'user',
-            '-created_at'
+            '-created_at',
+            ('user', '-created_at', '-id')
         ]
     }
     
     def __str__(self):
         return f"Session {self.id} - {self.user.email}"
+    
+    def save(self, *args, **kwargs):
+        """Override save to keep the listing previews in sync with the texts"""
+        if self.summary is not None:
+            self.summary_preview = make_preview(self.summary, SUMMARY_PREVIEW_LENGTH)
+        if self.document_text is not None:
+            self.document_preview = make_preview(self.document_text, DOCUMENT_PREVIEW_LENGTH)
+        return super(DocumentSession, self).save(*args, **kwargs)
 
 class ChatMessage(Document):
     """Chat messages for document Q&A"""
     session = ReferenceField(DocumentSession, required=True)
-    message = StringField(required=True)
+    message = CompressedStringField(required=True)
     is_user = BooleanField(default=True)  # True for user, False for AI
     created_at = DateTimeField(default=datetime.utcnow)
     
     meta = {
         'collection': 'chat_messages',
         'indexes': [
-            'session',
+            # Serves both filtering by session and paging through it in order
+            ('session', 'created_at', 'id'),
             'created_at'
         ]
     }
     
     def __str__(self):
         return f"{'User' if self.is_user else 'AI'}: {self.message[:50]}"
+
+class DocumentTextPage(Document):
+    """One page of a session's extracted text, compressed"""
+    session = ReferenceField(DocumentSession, required=True, reverse_delete_rule=CASCADE)
+    number = IntField(required=True)  # 0-based
+    char_start = IntField(required=True)  # Offsets of the page in the full text
+    char_end = IntField(required=True)
+    data = BinaryField(required=True)
+    
+    meta = {
+        'collection': 'document_text_pages',
+        'indexes': [
+            {'fields': ('session', 'number'), 'unique': True},
+            ('session', 'char_start')
+        ]
+    }
+
+class PassageIndex(Document):
+    """BM25 index over clause-sized passages of a session's document; the postings are in PassagePostings"""
+    session = ReferenceField(DocumentSession, required=True, unique=True, reverse_delete_rule=CASCADE)
+    spans = ListField(ListField(IntField()))  # [start, end] character offsets per passage
+    lengths = ListField(IntField())  # Token count per passage
+    average_length = FloatField(default=0.0)
+    posting_chunks = IntField(default=0)  # Terms are hashed into this many PassagePostings
+    postings = DictField()  # Indexes built before chunking keep their postings here
+    failed_at = DateTimeField()  # Set instead of the above when building failed
+    
+    meta = {
+        'collection': 'passage_indexes',
+    }
+
+class PassagePostings(Document):
+    """One hash bucket of a passage index's postings, keeping each document well under the BSON size limit"""
+    session = ReferenceField(DocumentSession, required=True, reverse_delete_rule=CASCADE)
+    chunk = IntField(required=True)
+    postings = DictField()  # term -> [passage, term frequency, passage, term frequency, ...]
+    
+    meta = {
+        'collection': 'passage_postings',
+        'indexes': [
+            {'fields': ('session', 'chunk'), 'unique': True}
+        ]
+    }
+
+class MinHashSignature(Document):
+    """MinHash signature of a session's document, indexed by LSH band for near-duplicate lookups"""
+    session = ReferenceField(DocumentSession, required=True, unique=True, reverse_delete_rule=CASCADE)
+    user = ReferenceField(User, required=True)
+    signature = ListField(IntField())
+    bands = ListField(StringField())  # One key per band of the signature
+    created_at = DateTimeField(default=datetime.utcnow)
+    
+    meta = {
+        'collection': 'minhash_signatures',
+        'indexes': [
+            # Candidates are looked up per user by any matching band
+            ('user', 'bands')
+        ]
+    }
+
+class ExtractionCacheEntry(Document):
+    """Extracted text keyed by the SHA-256 of the uploaded file bytes"""
+    key = StringField(primary_key=True)
+    text = CompressedStringField(required=True)
+    page_offsets = ListField(IntField())  # Start offset of each page in text
+    hits = IntField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    last_accessed = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'extraction_cache',
+        'indexes': [
+            # Entries expire once they have not been read for the TTL
+            {'fields': ['last_accessed'], 'expireAfterSeconds': settings.DOCUMENT_CACHE_TTL},
+        ]
+    }
+
+class SummaryCacheEntry(Document):
+    """Summaries keyed by the SHA-256 of the normalized text and prompt version"""
+    key = StringField(primary_key=True)
+    summary = CompressedStringField(required=True)
+    hits = IntField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    last_accessed = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'summary_cache',
+        'indexes': [
+            {'fields': ['last_accessed'], 'expireAfterSeconds': settings.DOCUMENT_CACHE_TTL},
+        ]
+    }
+
+class CacheStats(Document):
+    """Hit and miss counters for one cache tier"""
+    tier = StringField(primary_key=True)
+    hits = IntField(default=0)
+    misses = IntField(default=0)
+
+    meta = {
+        'collection': 'cache_stats',
+    }
+
+class SummarizationJob(Document):
+    """Background summarization of one uploaded document"""
+    STATUSES = ('queued', 'running', 'succeeded', 'failed')
+    STAGES = ('queued', 'extracting', 'summarizing', 'saving', 'done')
+
+    user = ReferenceField(User, required=True)
+    filename = StringField(required=True)
+    upload = BinaryField()  # Raw file bytes, cleared once the job finishes
+    status = StringField(choices=STATUSES, default='queued')
+    stage = StringField(choices=STAGES, default='queued')
+    progress = FloatField(default=0.0)
+    error = StringField()
+    session = ReferenceField(DocumentSession)
+    # Incremented on every claim; a worker only writes while its attempt is current
+    attempt = IntField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)  # Heartbeat while running
+
+    meta = {
+        'collection': 'summarization_jobs',
+        'indexes': [
+            'user',
+            ('status', 'created_at'),
+        ]
+    }
+
+    def __str__(self):
+        return f"Job {self.id} - {self.filename} ({self.status})"
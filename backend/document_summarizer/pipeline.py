@@ -0,0 +1,162 @@
+from bson import ObjectId
+from django.conf import settings
+
+from .models import DocumentSession, DOCUMENT_PREVIEW_LENGTH, make_preview
+from .extraction import extract_pages, join_pages
+from .summarization import summarize_legal_doc, summarize_changes, effective_chunk_size
+from .cache import extraction_cache, summary_cache, extraction_key, summary_key, count_outcome
+from .clauses import segment_clauses, clause_spans, clause_table, stored_clauses
+from .dedup import minhash, find_near_duplicate, clause_changes, index_signature
+from .retrieval import build_passage_index
+from .text_store import store_document_text, read_full_text
+from utils.llm_gateway import get_chat_client, DEFAULT_CHAT_MODEL
+from utils.search import index_document, SESSION
+
+
+class DocumentProcessingError(Exception):
+    """Raised when an upload cannot be turned into a session; the message is safe to return to the client."""
+
+
+def _no_progress(stage, progress):
+    pass
+
+
+def extract_text(filename, data, **options):
+    """
+    Extract the text and page offsets of an upload, without touching the
+    database, so it can also run in a worker process. options are passed
+    on to extract_pages.
+    """
+    try:
+        pages = extract_pages(filename, data, **options)
+    except Exception as e:
+        raise DocumentProcessingError(f'Error extracting text from file: {str(e)}')
+    if pages is None:
+        raise DocumentProcessingError('Error extracting text from file.')
+    text, page_offsets = join_pages(pages)
+    if not text:
+        raise DocumentProcessingError('Unsupported file type. Please upload PDF, DOCX, or TXT')
+    return text, page_offsets
+
+
+def extract_document(filename, data):
+    """Text and page offsets of an upload, from the extraction cache when possible."""
+    # Repeat uploads of the same file skip extraction entirely
+    content_hash = extraction_key(data)
+    cached = extraction_cache.get(content_hash)
+    if cached:
+        return cached.text, cached.page_offsets
+
+    text, page_offsets = extract_text(filename, data)
+    extraction_cache.set(content_hash, text=text, page_offsets=page_offsets)
+    return text, page_offsets
+
+
+def _summarize_from_near_duplicate(user, text, signature, spans):
+    """
+    Summarize text by updating the summary of the user's most similar
+    earlier document with the clauses that differ. Returns None when there
+    is no near duplicate, or the differences are too large for one call.
+    """
+    base_id, score = find_near_duplicate(user, signature)
+    if base_id is None:
+        count_outcome('near_duplicate', 'misses')
+        return None
+    base = (
+        DocumentSession.objects(id=base_id)
+        .only('id', 'summary', 'text_storage', 'document_text', 'clause_ids', 'clause_kinds', 'clause_offsets')
+        .first()
+    )
+    if not base:
+        return None
+
+    base_clauses = stored_clauses(base)
+    added, removed = clause_changes(
+        read_full_text(base),
+        text,
+        clause_spans(base_clauses) if base_clauses is not None else None,
+        spans,
+    )
+    if sum(map(len, added + removed)) > effective_chunk_size():
+        count_outcome('near_duplicate', 'misses')
+        return None
+    count_outcome('near_duplicate', 'hits')
+    if not added and not removed:
+        return base.summary
+    llm = get_chat_client(DEFAULT_CHAT_MODEL, temperature=0.3)
+    return summarize_changes(base.summary, added, removed, llm)
+
+
+def save_document(user, text, page_offsets, on_progress=None):
+    """Summarize extracted text and save it as a DocumentSession."""
+    on_progress = on_progress or _no_progress
+
+    on_progress('summarizing', 0.4)
+    # Segmented once here; chunking, the passage index and near-duplicate
+    # diffs all reuse these spans
+    clauses = segment_clauses(text)
+    spans = clause_spans(clauses)
+    # Identical text (after whitespace normalization) reuses its summary;
+    # its signature is already indexed with the session it came from
+    text_key = summary_key(text)
+    cached = summary_cache.get(text_key)
+    signature = None
+    if cached:
+        summary = cached.summary
+    else:
+        summary = None
+        if settings.DEDUP_ENABLED:
+            signature = minhash(text)
+            # The same template with names and dates changed only needs
+            # the changed clauses summarized
+            try:
+                summary = _summarize_from_near_duplicate(user, text, signature, spans)
+            except Exception as e:
+                print(f"Error reusing a near-duplicate summary: {e}")
+        if summary is None:
+            # Reported after every LLM call, which also keeps a background
+            # job's heartbeat fresh during long map-reduce runs
+            summary = summarize_legal_doc(
+                text, spans, on_progress=lambda fraction: on_progress('summarizing', 0.4 + 0.5 * fraction),
+            )
+        summary_cache.set(text_key, summary=summary)
+
+    on_progress('saving', 0.9)
+    # The full text is stored out of line as compressed pages; the id is
+    # assigned up front so the session only appears once its pages exist.
+    session = DocumentSession(
+        id=ObjectId(),
+        user=user,
+        summary=summary,
+        document_preview=make_preview(text, DOCUMENT_PREVIEW_LENGTH),
+        **clause_table(clauses)
+    )
+    store_document_text(session, text, page_offsets)
+    session.save(force_insert=True)
+
+    # Chat falls back to building the index on first use if this fails
+    try:
+        build_passage_index(session, text, spans=spans)
+    except Exception as e:
+        print(f"Error building passage index for session {session.id}: {e}")
+    if signature:
+        try:
+            index_signature(session, signature)
+        except Exception as e:
+            print(f"Error indexing signature for session {session.id}: {e}")
+    index_document(SESSION, session.id, user.id, summary=summary, content=text)
+    return session
+
+
+def process_document(user, filename, data, on_progress=None):
+    """
+    Extract, summarize and save one uploaded document as a DocumentSession.
+
+    on_progress(stage, progress) is called as the document moves through
+    the extracting, summarizing and saving stages.
+    """
+    on_progress = on_progress or _no_progress
+
+    on_progress('extracting', 0.1)
+    text, page_offsets = extract_document(filename, data)
+    return save_document(user, text, page_offsets, on_progress)
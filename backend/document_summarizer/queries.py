@@ -0,0 +1,125 @@
+from mongoengine.queryset.visitor import Q
+
+from utils.pagination import encode_cursor, decode_cursor
+from .models import DocumentSession, ChatMessage, SUMMARY_PREVIEW_LENGTH, DOCUMENT_PREVIEW_LENGTH
+
+
+def _preview_expression(preview_field, source_field, length):
+    """Use the stored preview, falling back to slicing the source for sessions saved before previews existed."""
+    source = f'${source_field}'
+    return {'$ifNull': [f'${preview_field}', {
+        '$switch': {
+            'branches': [
+                # Compressed sources (see utils.compression) always have a preview
+                {'case': {'$ne': [{'$type': source}, 'string']}, 'then': ''},
+                {'case': {'$gt': [{'$strLenCP': source}, length]},
+                 'then': {'$concat': [{'$substrCP': [source, 0, length]}, '...']}},
+            ],
+            'default': source,
+        }
+    }]}
+
+
+def list_user_sessions(user, limit, before=None):
+    """
+    One page of a user's sessions, newest first, with message counts.
+
+    Runs as a single aggregation: previews are projected instead of the
+    full texts and message counts come from a $lookup on chat_messages.
+    Returns the sessions and the cursor of the next page (or None).
+    """
+    match = {'user': user.id}
+    if before:
+        created_at, object_id = decode_cursor(before)
+        match['$or'] = [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': object_id}},
+        ]
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'created_at': -1, '_id': -1}},
+        {'$limit': limit + 1},
+        {'$project': {
+            'created_at': 1,
+            'summary_preview': _preview_expression('summary_preview', 'summary', SUMMARY_PREVIEW_LENGTH),
+            'document_preview': _preview_expression('document_preview', 'document_text', DOCUMENT_PREVIEW_LENGTH),
+        }},
+        {'$lookup': {
+            'from': ChatMessage._get_collection_name(),
+            'localField': '_id',
+            'foreignField': 'session',
+            'pipeline': [{'$count': 'count'}],
+            'as': 'message_stats',
+        }},
+    ]
+    rows = list(DocumentSession._get_collection().aggregate(pipeline))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['_id'])
+
+    sessions = [
+        {
+            'id': str(row['_id']),
+            'summary_preview': row['summary_preview'],
+            'created_at': row['created_at'].isoformat(),
+            'message_count': row['message_stats'][0]['count'] if row['message_stats'] else 0,
+            'document_preview': row['document_preview'],
+        }
+        for row in rows
+    ]
+    return sessions, next_cursor
+
+
+def serialize_message(msg):
+    return {
+        'id': str(msg.id),
+        'message': msg.message,
+        'is_user': msg.is_user,
+        'timestamp': msg.created_at.isoformat()
+    }
+
+
+def list_chat_messages(session, limit, before=None, after=None):
+    """
+    One page of a session's messages in chronological order.
+
+    Without a cursor this is the most recent page. `before` pages back
+    through older messages; `after` returns only messages newer than the
+    client's last one, for incremental sync. Both walk the
+    (session, created_at, _id) index, so the cost does not grow with the
+    length of the thread.
+    """
+    query = Q(session=session)
+    if after:
+        created_at, object_id = decode_cursor(after)
+        query &= Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=object_id)
+        order = ('created_at', 'id')
+    else:
+        if before:
+            created_at, object_id = decode_cursor(before)
+            query &= Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=object_id)
+        order = ('-created_at', '-id')
+
+    messages = list(
+        ChatMessage.objects(query)
+        .order_by(*order)
+        .exclude('session')
+        .limit(limit + 1)
+    )
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
+
+    page = {
+        # Pass as ?before= to load older messages
+        'before': encode_cursor(messages[0].created_at, messages[0].id) if messages else before,
+        # Pass as ?after= to fetch only messages newer than this page
+        'after': encode_cursor(messages[-1].created_at, messages[-1].id) if messages else after,
+        # More messages exist past this page in the direction being paged
+        'has_more': has_more,
+    }
+    return [serialize_message(msg) for msg in messages], page
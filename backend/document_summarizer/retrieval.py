@@ -0,0 +1,220 @@
+import math
+import re
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from mongoengine.errors import NotUniqueError
+
+from .models import PassageIndex, PassagePostings
+from .clauses import block_spans
+from .text_store import read_full_text
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall "
+    "that the this to was were will with which any such all not".split()
+)
+
+# Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# (passage, term frequency) pairs per PassagePostings document: about 3 MB of
+# BSON, so even skewed hash buckets stay far below the 16 MB document limit
+POSTINGS_PER_CHUNK = 100000
+
+# A session whose index failed to build is not retried on every question
+FAILED_BUILD_RETRY_AFTER = timedelta(hours=1)
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def passage_spans(text, passage_size=None, spans=None):
+    """
+    Group the text into clause-sized passages of at most passage_size
+    characters, returned as (start, end) offsets into the text. spans are
+    the clause offsets when the document has already been segmented.
+    """
+    passage_size = passage_size or settings.CHAT_PASSAGE_SIZE
+    passages = []
+    current_start = current_end = None
+    for start, end in spans if spans is not None else block_spans(text):
+        # A single clause longer than a passage is cut at whitespace
+        while end - start > passage_size:
+            if current_start is not None:
+                passages.append((current_start, current_end))
+                current_start = None
+            cut = text.rfind(' ', start, start + passage_size)
+            cut = cut if cut > start else start + passage_size
+            passages.append((start, cut))
+            start = cut
+        if current_start is not None and end - current_start > passage_size:
+            passages.append((current_start, current_end))
+            current_start = None
+        if current_start is None:
+            current_start = start
+        current_end = end
+    if current_start is not None:
+        passages.append((current_start, current_end))
+    return passages
+
+
+def _chunk_of(term, chunk_count):
+    return zlib.crc32(term.encode('utf-8')) % chunk_count
+
+
+def _build_passage_index(session, text, passage_size, spans):
+    if text is None:
+        text = read_full_text(session)
+    spans = passage_spans(text, passage_size, spans)
+    lengths, postings = [], {}
+    for number, (start, end) in enumerate(spans):
+        counts = Counter(tokenize(text[start:end]))
+        lengths.append(sum(counts.values()))
+        for term, frequency in counts.items():
+            postings.setdefault(term, []).extend((number, frequency))
+
+    pairs = sum(len(posting) for posting in postings.values()) // 2
+    chunk_count = max(1, -(-pairs // POSTINGS_PER_CHUNK))
+    chunks = [{} for _ in range(chunk_count)]
+    for term, posting in postings.items():
+        chunks[_chunk_of(term, chunk_count)][term] = posting
+
+    PassageIndex.objects(session=session).delete()
+    PassagePostings.objects(session=session).delete()
+    # The postings go in first, so an index is only visible once complete
+    PassagePostings.objects.insert(
+        [PassagePostings(session=session, chunk=number, postings=chunk) for number, chunk in enumerate(chunks)],
+        load_bulk=False,
+    )
+    index = PassageIndex(
+        session=session,
+        spans=[list(span) for span in spans],
+        lengths=lengths,
+        average_length=(sum(lengths) / len(lengths)) if lengths else 0.0,
+        posting_chunks=chunk_count,
+    )
+    index.save()
+    return index
+
+
+def _record_failed_build(session):
+    """Mark a session's index as failed, unless a complete one was saved meanwhile."""
+    try:
+        PassageIndex.objects(
+            session=session, __raw__={'$or': [{'posting_chunks': 0}, {'posting_chunks': {'$exists': False}}]}
+        ).update_one(
+            set__failed_at=datetime.utcnow(), set__spans=[], set__lengths=[], set__posting_chunks=0,
+            unset__postings=True, upsert=True,
+        )
+    except NotUniqueError:
+        # The filter missed because a complete index exists; leave it alone
+        pass
+    except Exception as e:
+        print(f"Error recording failed passage index for session {session.id}: {e}")
+
+
+def _saved_index(session):
+    return PassageIndex.objects(session=session).exclude('postings').no_dereference().first()
+
+
+def build_passage_index(session, text=None, passage_size=None, spans=None):
+    """
+    Build and save the BM25 index over a session's document, reading the
+    text from storage unless it is passed in (with its clause spans).
+
+    Postings are stored flat as [passage, term frequency, passage, ...]
+    per term, hashed by term into PassagePostings chunks of about
+    POSTINGS_PER_CHUNK pairs each, so that a question only loads the
+    chunks of its own terms. A failed build is recorded before the error
+    is re-raised, so get_passage_index does not retry it on every question;
+    a build that collides with another request building the same index
+    returns that request's index instead, or raises without recording.
+    """
+    try:
+        return _build_passage_index(session, text, passage_size, spans)
+    except NotUniqueError:
+        index = _saved_index(session)
+        if index and index.posting_chunks and not index.failed_at:
+            return index
+        # The other build is still running and records its own outcome
+        raise
+    except Exception:
+        _record_failed_build(session)
+        raise
+
+
+def get_passage_index(session):
+    """
+    Load a session's index, building it for sessions created before
+    indexing existed. Returns None while a failed build is not yet due
+    for a retry.
+    """
+    index = _saved_index(session)
+    if index and not index.failed_at:
+        return index
+    if index and index.failed_at > datetime.utcnow() - FAILED_BUILD_RETRY_AFTER:
+        return None
+    try:
+        return build_passage_index(session)
+    except Exception as e:
+        print(f"Error building passage index for session {session.id}: {e}")
+        return None
+
+
+def _load_postings(index, terms):
+    """The postings of the given terms, reading only the chunks (and keys) they hash to."""
+    projection = {'postings.' + term: 1 for term in terms}
+    if not index.posting_chunks:
+        # Built before postings were chunked: they are on the index itself
+        documents = PassageIndex._get_collection().find({'_id': index.id}, projection)
+    else:
+        documents = PassagePostings._get_collection().find({
+            'session': index.session.id,
+            'chunk': {'$in': sorted({_chunk_of(term, index.posting_chunks) for term in terms})},
+        }, projection)
+    postings = {}
+    for document in documents:
+        postings.update(document.get('postings', {}))
+    return postings
+
+
+def top_passages(index, question, k=None):
+    """
+    Rank passages against a question with BM25 and return the best k as
+    dicts with start/end offsets and score, in document order. index may
+    be None (no usable index), which gives no passages.
+    """
+    k = k or settings.CHAT_TOP_K_PASSAGES
+    passage_count = len(index.spans) if index else 0
+    if not passage_count:
+        return []
+
+    scores = Counter()
+    terms = set(tokenize(question))
+    postings = _load_postings(index, terms) if terms else {}
+    for term in terms:
+        posting = postings.get(term)
+        if not posting:
+            continue
+        document_frequency = len(posting) // 2
+        idf = math.log(1 + (passage_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        for number, frequency in zip(posting[::2], posting[1::2]):
+            norm = K1 * (1 - B + B * index.lengths[number] / (index.average_length or 1))
+            scores[number] += idf * frequency * (K1 + 1) / (frequency + norm)
+
+    # Questions with no matching terms still get the opening passages
+    ranked = [number for number, _ in scores.most_common(k)] or list(range(min(k, passage_count)))
+    return [
+        {
+            'start': index.spans[number][0],
+            'end': index.spans[number][1],
+            'score': round(scores.get(number, 0.0), 4),
+        }
+        for number in sorted(ranked)
+    ]
@@ -0,0 +1,207 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from utils.llm_gateway import get_chat_client, DEFAULT_CHAT_MODEL
+from utils.prompt_builder import PromptBuilder, estimate_tokens, CHARS_PER_TOKEN
+from .clauses import block_spans
+
+# Bump whenever the prompts below change so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "1"
+
+SUMMARY_PROMPT = (
+    "You are a legal assistant. Summarize this legal document clearly and concisely, "
+    "focusing on key clauses, parties involved, and any obligations or penalties.\n\n"
+    "Document:\n{text}"
+)
+
+CHUNK_PROMPT = (
+    "You are a legal assistant. The following is part {index} of {total} of a longer legal document. "
+    "Summarize this part clearly and concisely, focusing on key clauses, parties involved, "
+    "and any obligations or penalties. Keep clause numbers where they appear.\n\n"
+    "Document part:\n{text}"
+)
+
+REDUCE_PROMPT = (
+    "You are a legal assistant. The following are summaries of consecutive parts of one legal document. "
+    "Combine them into a single clear and concise summary of the whole document, focusing on key clauses, "
+    "parties involved, and any obligations or penalties. Remove repetition between parts.\n\n"
+    "Part summaries:\n{text}"
+)
+
+DELTA_PROMPT = (
+    "You are a legal assistant. Below is the summary of a legal document, followed by the clauses that "
+    "changed in a new version of it. Update the summary so it accurately describes the new version, "
+    "changing only what the changed clauses affect (parties, dates, amounts, obligations or penalties). "
+    "Keep the same structure and style.\n\n"
+    "Summary of the previous version:\n{summary}\n\n"
+    "Changed clauses:\n{text}"
+)
+
+SENTENCE_END = re.compile(r"(?<=[.;:])\s+")
+
+
+def _split_oversized(block, chunk_size):
+    """Split a block with no clause boundary inside it at sentence ends, then hard-wrap."""
+    pieces, current = [], ""
+    for sentence in SENTENCE_END.split(block):
+        while len(sentence) > chunk_size:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:chunk_size])
+            sentence = sentence[chunk_size:]
+        if current and len(current) + len(sentence) + 1 > chunk_size:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text, chunk_size=None, spans=None):
+    """
+    Split text into chunks of at most chunk_size characters, breaking on
+    clause and section boundaries wherever possible. spans are the clause
+    offsets when the document has already been segmented.
+    """
+    chunk_size = chunk_size or settings.SUMMARY_CHUNK_SIZE
+    chunks, current = [], ""
+    for start, end in spans if spans is not None else block_spans(text):
+        block = text[start:end].strip()
+        if not block:
+            continue
+        if len(block) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_oversized(block, chunk_size))
+            continue
+        if current and len(current) + len(block) + 2 > chunk_size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def effective_chunk_size(chunk_size=None):
+    """
+    The chunk size in characters, capped so that a chunk and the longest
+    prompt template fit in SUMMARY_PROMPT_TOKENS.
+    """
+    chunk_size = chunk_size or settings.SUMMARY_CHUNK_SIZE
+    template_tokens = max(estimate_tokens(template) for template in (SUMMARY_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT))
+    return max(CHARS_PER_TOKEN, min(chunk_size, (settings.SUMMARY_PROMPT_TOKENS - template_tokens) * CHARS_PER_TOKEN))
+
+
+def _fit_prompt(template, text, **fields):
+    """Fill a prompt template, cutting the text if the prompt would exceed SUMMARY_PROMPT_TOKENS."""
+    built = (
+        PromptBuilder(settings.SUMMARY_PROMPT_TOKENS)
+        .add('instructions', template.format(text='', **fields), trim=None)
+        .add('document', text)
+        .build()
+    )
+    return template.format(text=built.text('document'), **fields)
+
+
+def _invoke(llm, prompt):
+    response = llm.invoke(prompt)
+    # Chat models return a message, plain LLMs (including the fake ones) a string.
+    return getattr(response, 'content', response)
+
+
+def _no_progress(fraction):
+    pass
+
+
+def _map_concurrently(llm, prompts, max_concurrency, on_call=None):
+    """
+    Run prompts with at most max_concurrency LLM calls in flight, keeping
+    order. on_call() runs after each call completes, in the thread that made it.
+    """
+    on_call = on_call or (lambda: None)
+
+    def run(prompt):
+        result = _invoke(llm, prompt)
+        on_call()
+        return result
+
+    if len(prompts) == 1:
+        return [run(prompts[0])]
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(prompts))) as pool:
+        return list(pool.map(run, prompts))
+
+
+def summarize_text(text, llm, chunk_size=None, max_concurrency=None, spans=None, on_progress=None):
+    """
+    Summarize a document of any length.
+
+    Documents that fit in one chunk are summarized with a single call.
+    Longer ones are split on clause boundaries, the chunks are summarized
+    concurrently (map), and the partial summaries are combined (reduce),
+    repeating the reduce step until the partials fit in one chunk. Every
+    prompt is kept within SUMMARY_PROMPT_TOKENS. spans are the document's
+    clause offsets, if already known.
+
+    on_progress(fraction) is called after every LLM call with an estimate
+    of the work done, from 0 to 1; the map covers the first 80%.
+    """
+    chunk_size = effective_chunk_size(chunk_size)
+    max_concurrency = max_concurrency or settings.SUMMARY_MAX_CONCURRENCY
+    on_progress = on_progress or _no_progress
+
+    if len(text) <= chunk_size:
+        summary = _invoke(llm, _fit_prompt(SUMMARY_PROMPT, text))
+        on_progress(1.0)
+        return summary
+
+    chunks = split_into_chunks(text, chunk_size, spans)
+    mapped = []
+
+    def on_mapped():
+        # Called from the pool's threads; list.append is atomic
+        mapped.append(None)
+        on_progress(0.8 * len(mapped) / len(chunks))
+
+    partials = _map_concurrently(
+        llm,
+        [_fit_prompt(CHUNK_PROMPT, chunk, index=i + 1, total=len(chunks)) for i, chunk in enumerate(chunks)],
+        max_concurrency,
+        on_mapped,
+    )
+
+    while True:
+        groups = split_into_chunks("\n\n".join(partials), chunk_size)
+        reduced = _map_concurrently(
+            llm, [_fit_prompt(REDUCE_PROMPT, group) for group in groups], max_concurrency, lambda: on_progress(0.9),
+        )
+        # Stop once everything was reduced in one call, or when a round no
+        # longer shrinks the number of partials (summaries longer than a chunk).
+        if len(groups) == 1 or len(reduced) >= len(partials):
+            return "\n\n".join(reduced)
+        partials = reduced
+
+
+def summarize_changes(summary, added, removed, llm):
+    """Update a near-duplicate document's summary from the clauses that differ."""
+    changes = "\n\n".join(
+        [f"Added or edited:\n{clause}" for clause in added]
+        + [f"Removed:\n{clause}" for clause in removed]
+    )
+    return _invoke(llm, _fit_prompt(DELTA_PROMPT, changes, summary=summary))
+
+
+def summarize_legal_doc(text, spans=None, on_progress=None):
+    """Use Gemini API through LangChain to summarize legal text."""
+    try:
+        # Long documents are summarized chunk by chunk and then combined
+        return summarize_text(
+            text, get_chat_client(DEFAULT_CHAT_MODEL, temperature=0.3), spans=spans, on_progress=on_progress,
+        )
+    except Exception as e:
+        raise Exception(f"Error generating summary with Gemini API: {str(e)}")
@@ -1,3 +1,98 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+from langchain_core.language_models import FakeListLLM
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .clauses import segment_clauses
+from .memory import _advance
+from . import views
+from .summarization import summarize_text
+
+# FakeListLLM starts over after its last response, so every test ends the
+# list with one that must stay unused and checks llm.i for the call count
+UNUSED = "This response should never be used"
+
+
+def _clause(number, length=150):
+    text = f"{number}. The Tenant shall comply with clause {number} of this Agreement"
+    return (text + " and its schedules" * length)[:length]
+
+
+class SummarizeTextTests(SimpleTestCase):
+    """summarize_text against a fake LLM; one call at a time so responses come back in order."""
+
+    def test_single_chunk_is_one_call(self):
+        llm = FakeListLLM(responses=["The whole summary", UNUSED])
+        summary = summarize_text(_clause(1), llm, chunk_size=200, max_concurrency=1)
+        self.assertEqual(summary, "The whole summary")
+        self.assertEqual(llm.i, 1)
+
+    def test_map_then_reduce(self):
+        text = "\n\n".join(_clause(number) for number in (1, 2, 3))
+        llm = FakeListLLM(responses=["Part one", "Part two", "Part three", "Combined summary", UNUSED])
+        progress = []
+        summary = summarize_text(text, llm, chunk_size=200, max_concurrency=1, on_progress=progress.append)
+        self.assertEqual(summary, "Combined summary")
+        # Three chunks mapped, then one reduce over the short partials
+        self.assertEqual(llm.i, 4)
+        self.assertEqual(progress, sorted(progress))
+        self.assertAlmostEqual(progress[2], 0.8)
+
+    def test_reduce_that_does_not_shrink_returns_joined_partials(self):
+        text = "\n\n".join(_clause(number) for number in (1, 2, 3))
+        # Partials as long as the chunks never fit two to a reduce group
+        long_partials = [_clause(number) for number in (4, 5, 6)]
+        llm = FakeListLLM(responses=long_partials + ["Reduced one", "Reduced two", "Reduced three", UNUSED])
+        summary = summarize_text(text, llm, chunk_size=200, max_concurrency=1)
+        self.assertEqual(summary, "Reduced one\n\nReduced two\n\nReduced three")
+        self.assertEqual(llm.i, 6)
+
+
+def _ids(text):
+    return [(clause_id, kind) for clause_id, kind, start, end in segment_clauses(text)]
+
+
+class SegmentClausesTests(SimpleTestCase):
+    def test_schedules_and_numbered_clauses(self):
+        text = "1. Rent\n\nSCHEDULE 1\nThe Property\n1. Land\n2. Buildings\n\nANNEXURE B - Payment Terms\n(a) Monthly"
+        self.assertEqual(
+            _ids(text),
+            [('1', 'c'), ('schedule-1', 's'), ('schedule-1/1', 'c'), ('schedule-1/2', 'c'),
+             ('schedule-B', 's'), ('(a)', 'c')],
+        )
+
+    def test_prose_starting_with_a_schedule_word_is_not_a_schedule(self):
+        text = "1. Rent\n\nSchedule text is attached to this lease.\n\nExhibit A shall govern payments\n\n2. Term"
+        self.assertNotIn('s', [kind for clause_id, kind in _ids(text)])
+        self.assertEqual(_ids(text)[-1], ('2', 'c'))
+
+    def test_years_and_amounts_are_not_clause_numbers(self):
+        text = "1. Rent\n2024 rent is fixed at 1000.\n30 days notice applies.\n2. Term\n3.4.1 Renewal"
+        self.assertEqual(_ids(text), [('1', 'c'), ('2', 'c'), ('3.4.1', 'c')])
+
+
+class MemoryWindowTests(SimpleTestCase):
+    entries = [{'is_user': number % 2 == 0, 'message': f"Message {number}."} for number in range(4)]
+
+    @override_settings(CHAT_MEMORY_WINDOW=2)
+    def test_oldest_messages_are_folded_into_the_summary(self):
+        summary, window = _advance("", self.entries[:3], self.entries[3:])
+        self.assertEqual(window, self.entries[2:])
+        self.assertEqual(summary, "User: Message 0.\nAssistant: Message 1.")
+
+    @override_settings(CHAT_MEMORY_WINDOW=0)
+    def test_window_of_zero_keeps_only_the_summary(self):
+        summary, window = _advance("", self.entries[:2], self.entries[2:])
+        self.assertEqual(window, [])
+        self.assertEqual(summary.count("\n"), 3)
+
+
+class SummarizationJobStatusTests(SimpleTestCase):
+    def test_malformed_job_id_is_not_found(self):
+        request = APIRequestFactory().get("/summarizer/jobs/not-an-id/")
+        force_authenticate(request, user=mock.Mock(is_authenticated=True))
+        with mock.patch.object(views.SummarizationJob, 'objects') as objects:
+            response = views.summarization_job_status(request, 'not-an-id')
+        self.assertEqual(response.status_code, 404)
+        objects.assert_not_called()
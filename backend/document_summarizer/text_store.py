@@ -0,0 +1,128 @@
+import hashlib
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from mongoengine.queryset.visitor import Q
+
+from utils.compression import compress_text, decompress_text
+from .models import DocumentTextPage
+
+
+def page_spans(text, page_offsets=None):
+    """
+    (start, end) offsets of the pages of a text.
+
+    page_offsets are the real page starts from extraction (PDFs). Pages
+    longer than DOCUMENT_TEXT_PAGE_SIZE, and texts without page breaks
+    (DOCX, TXT), are cut into pages of that many characters.
+    """
+    starts = sorted(set(page_offsets or [])) or [0]
+    if starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    spans = []
+    for start, end in zip(bounds, bounds[1:]):
+        while end - start > settings.DOCUMENT_TEXT_PAGE_SIZE:
+            spans.append((start, start + settings.DOCUMENT_TEXT_PAGE_SIZE))
+            start += settings.DOCUMENT_TEXT_PAGE_SIZE
+        spans.append((start, end))
+    return spans
+
+
+def store_document_text(session, text, page_offsets=None):
+    """
+    Write a session's text as compressed pages and record the page count,
+    size and hash on the (not yet saved) session.
+    """
+    spans = page_spans(text, page_offsets)
+    DocumentTextPage.objects.insert([
+        DocumentTextPage(
+            session=session,
+            number=number,
+            char_start=start,
+            char_end=end,
+            data=compress_text(text[start:end]),
+        )
+        for number, (start, end) in enumerate(spans)
+    ], load_bulk=False)
+    session.text_storage = 'pages'
+    session.page_count = len(spans)
+    session.text_size = len(text)
+    session.text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _stored_pages(session, *queries, **filters):
+    return (
+        DocumentTextPage.objects(*queries, session=session, **filters)
+        .only('number', 'char_start', 'char_end', 'data')
+        .order_by('number')
+    )
+
+
+def _merge_spans(spans):
+    """Sorted, non-overlapping (start, end) ranges covering the given ones."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def read_text_range(session, start, end):
+    """Characters [start, end) of a session's text, reading only the pages they span."""
+    return read_text_ranges(session, [(start, end)])[0]
+
+
+def read_text_ranges(session, spans):
+    """
+    Read several (start, end) ranges with a single page query, which loads
+    only the pages overlapping one of the ranges, not the ones between them.
+    """
+    if not spans:
+        return []
+    if session.text_storage != 'pages':
+        text = session.document_text or ''
+        return [text[start:end] for start, end in spans]
+    ranges = [(start, end) for start, end in _merge_spans(spans) if end > start]
+    if not ranges:
+        return ["" for _ in spans]
+    overlapping = reduce(or_, (Q(char_start__lt=end, char_end__gt=start) for start, end in ranges))
+    pages = list(_stored_pages(session, overlapping))
+    texts = {page.number: decompress_text(page.data) for page in pages}
+    results = []
+    for start, end in spans:
+        parts = [
+            texts[page.number][max(start, page.char_start) - page.char_start:min(end, page.char_end) - page.char_start]
+            for page in pages
+            if page.char_start < end and page.char_end > start
+        ]
+        results.append("".join(parts))
+    return results
+
+
+def read_pages(session, first, last):
+    """
+    Pages first..last (0-based, inclusive) as dicts with their number,
+    offsets and text. Legacy inline sessions are a single page.
+    """
+    if session.text_storage != 'pages':
+        text = session.document_text or ''
+        return [{'number': 0, 'start': 0, 'end': len(text), 'text': text}] if first == 0 else []
+    return [
+        {
+            'number': page.number,
+            'start': page.char_start,
+            'end': page.char_end,
+            'text': decompress_text(page.data),
+        }
+        for page in _stored_pages(session, number__gte=first, number__lte=last)
+    ]
+
+
+def read_full_text(session):
+    if session.text_storage != 'pages':
+        return session.document_text or ''
+    return "".join(decompress_text(page.data) for page in _stored_pages(session))
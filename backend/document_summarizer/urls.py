@@ -3,8 +3,18 @@ from . import views
 
 urlpatterns = [
     path('summarize/', views.summarize_document, name='summarize_document'),
+    path('summarize/batch/', views.summarize_batch, name='summarize_batch'),
+    path('jobs/', views.create_summarization_job, name='create_summarization_job'),
+    path('jobs/batch/', views.create_summarization_jobs_batch, name='create_summarization_jobs_batch'),
+    path('jobs/<str:job_id>/', views.summarization_job_status, name='summarization_job_status'),
     path('chat/', views.chat_message, name='chat_message'),
+    path('chat/stream/', views.chat_message_stream, name='chat_message_stream'),
     path('sessions/', views.user_sessions, name='user_sessions'),
     path('sessions/<str:session_id>/', views.session_detail, name='session_detail'),
     path('sessions/<str:session_id>/history/', views.chat_history, name='chat_history'),
+    path('sessions/<str:session_id>/text/', views.session_text, name='session_text'),
+    path('sessions/<str:session_id>/clauses/', views.session_clauses, name='session_clauses'),
+    # Clause ids can contain slashes ("schedule-1/3")
+    path('sessions/<str:session_id>/clauses/<path:clause_id>/', views.session_clause, name='session_clause'),
+    path('cache/stats/', views.document_cache_stats, name='document_cache_stats'),
 ]
\ No newline at end of file
@@ -1,115 +1,186 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated # Added AllowAny and IsAuthenticated import
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser # Added AllowAny and IsAuthenticated import
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
-from .models import DocumentSession, ChatMessage
+from django.http import StreamingHttpResponse
+from bson import ObjectId
+from bson.errors import InvalidId
+from utils.pagination import InvalidCursor, set_next_cursor
+from .models import DocumentSession, ChatMessage, SummarizationJob
+from .pipeline import process_document, DocumentProcessingError
+from .jobs import submit_job
+from .batch import collect_batch_files, process_batch
+from .cache import cache_stats
+from .retrieval import get_passage_index, top_passages
+from .queries import list_user_sessions, list_chat_messages
+from .access import get_owned_session, load_session_fields, SessionAccessError
+from .text_store import read_text_ranges, read_pages, read_full_text
+from .clauses import segment_clauses, clause_table, stored_clauses, clauses_in_range, CLAUSE_FIELDS, KINDS
+from .memory import conversation_context, record_exchange, MEMORY_FIELDS
 from authentication.models import User
-import fitz  # PyMuPDF for PDF
-from docx import Document
-from langchain_google_genai import ChatGoogleGenerativeAI
-from mongoengine import DoesNotExist
-
-def extract_text_from_file(uploaded_file):
-    """Extract text depending on file type."""
-    if uploaded_file.name.endswith('.pdf'):
-        try:
-            text = ""
-            with fitz.open(stream=uploaded_file.read(), filetype="pdf") as doc:
-                for page in doc:
-                    text += page.get_text()
-            return text
-        except fitz.FileDataError as e:
-            return None
-        except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
-
-    elif uploaded_file.name.endswith('.docx'):
-        doc = Document(uploaded_file)
-        return "\n".join([p.text for p in doc.paragraphs])
-
-    elif uploaded_file.name.endswith('.txt'):
-        return uploaded_file.read().decode('utf-8')
-
-    else:
-        return None
-
-def summarize_legal_doc(text):
-    """Use Gemini API through LangChain to summarize legal text."""
-    try:
-        # Explicitly configure API key
-        import google.generativeai as genai
-        
-        if not settings.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY is not configured in settings")
-            
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            temperature=0.3,
-            google_api_key=settings.GEMINI_API_KEY,  # Explicitly pass API key
-        )
+from utils.llm_gateway import get_chat_client, DEFAULT_CHAT_MODEL
+from utils.prompt_builder import PromptBuilder
+import json
 
-        prompt = (
-            "You are a legal assistant. Summarize this legal document clearly and concisely, "
-            "focusing on key clauses, parties involved, and any obligations or penalties.\n\n"
-            f"Document:\n{text[:10000]}"  # limit input
-        )
+SESSION_PAGE_SIZE = 50
+MAX_SESSION_PAGE_SIZE = 100
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+MAX_TEXT_RANGE = 100000  # Characters per ranged text read
+MAX_TEXT_PAGES = 20  # Pages per ranged text read
 
-        response = llm.invoke(prompt)
-        return response.content
-    except Exception as e:
-        raise Exception(f"Error generating summary with Gemini API: {str(e)}")
-
-def chat_with_document(session, user_message):
-    """Use Gemini to answer questions about the document."""
-    try:
-        # Explicitly configure API key
-        import google.generativeai as genai
-        
-        if not settings.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY is not configured in settings")
-            
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            temperature=0.3,
-            google_api_key=settings.GEMINI_API_KEY,  # Explicitly pass API key
-        )
-        
-        # Get chat history for context
-        recent_messages = ChatMessage.objects(session=session).order_by('created_at')[:10]
-        chat_history = "\n".join([
-            f"{'User' if msg.is_user else 'Assistant'}: {msg.message}" 
-            for msg in recent_messages
-        ])
-        
-        prompt = f"""
+CHAT_PROMPT = """
         You are a legal assistant helping a user understand a legal document.
         
-        Original Document (first 5000 characters):
-        {session.document_text[:5000]}
+        Relevant Passages From The Document:
+        {passages}
         
         Document Summary:
-        {session.summary}
+        {summary}
         
         Previous Conversation:
-        {chat_history}
+        {history}
         
-        Current User Question: {user_message}
+        Current User Question: {question}
         
         Please provide a helpful, accurate response based on the document content and summary.
         If the question cannot be answered from the document, politely state that.
         Keep your response clear and concise.
         """
-        
+
+def _passage_label(passage):
+    if passage['clauses']:
+        return "Clause " + ", ".join(passage['clauses'])
+    return f"Characters {passage['start']}-{passage['end']}"
+
+def _build_chat_prompt(session, user_message):
+    """
+    Assemble the document Q&A prompt for a session within CHAT_PROMPT_TOKENS.
+
+    Returns the prompt, the passages of the document it includes and its
+    estimated token count. The question and instructions are always kept;
+    conversation history, then the summary, then the lowest-scoring
+    passages are trimmed when the prompt is over budget.
+    """
+    # Only the passages most relevant to the question go into the prompt
+    passages = top_passages(get_passage_index(session), user_message)
+    passage_texts = read_text_ranges(session, [(p['start'], p['end']) for p in passages])
+    clauses = stored_clauses(session) or []
+    for p in passages:
+        p['clauses'] = clauses_in_range(clauses, p['start'], p['end'])
+    ranked = sorted(zip(passages, passage_texts), key=lambda pair: pair[0]['score'], reverse=True)
+    
+    # Get chat history for context from the session's rolling memory
+    chat_history = conversation_context(session, exclude_latest_user_message=user_message)
+    
+    built = (
+        PromptBuilder(settings.CHAT_PROMPT_TOKENS)
+        .add('instructions', CHAT_PROMPT.format(passages='', summary='', history='', question=''), trim=None)
+        .add('question', user_message, trim=None)
+        .add('passages', [f"[{_passage_label(p)}]\n{text.strip()}" for p, text in ranked], priority=60)
+        .add('summary', session.summary, priority=50)
+        .add('history', chat_history, priority=40, trim='start')
+        .build()
+    )
+    # Passages are dropped lowest score first; the kept ones go back into document order
+    kept = sorted(zip([p for p, _ in ranked], built.items('passages')), key=lambda pair: pair[0]['start'])
+    prompt = CHAT_PROMPT.format(
+        passages="\n\n".join(text for _, text in kept),
+        summary=built.text('summary'),
+        history=built.text('history'),
+        question=user_message,
+    )
+    return prompt, [p for p, _ in kept], built.tokens
+
+def chat_with_document(session, user_message):
+    """
+    Use Gemini to answer questions about the document.
+
+    Returns the answer, the document passages it was grounded on and the
+    prompt's estimated token count.
+    """
+    try:
+        llm = get_chat_client(DEFAULT_CHAT_MODEL, temperature=0.3)
+        prompt, passages, prompt_tokens = _build_chat_prompt(session, user_message)
         response = llm.invoke(prompt)
-        return response.content
+        return response.content, passages, prompt_tokens
+    except Exception as e:
+        raise Exception(f"Error generating response with Gemini API: {str(e)}")
+
+def stream_chat_with_document(session, user_message):
+    """
+    Yield the answer to a question about the document piece by piece as
+    Gemini generates it. Closing this generator closes the upstream stream.
+
+    The first item yielded is the list of passages the prompt includes and
+    the prompt's estimated token count.
+    """
+    try:
+        llm = get_chat_client(DEFAULT_CHAT_MODEL, temperature=0.3)
+        prompt, passages, prompt_tokens = _build_chat_prompt(session, user_message)
+        stream = llm.stream(prompt)
+    except Exception as e:
+        raise Exception(f"Error generating response with Gemini API: {str(e)}")
+    try:
+        yield passages, prompt_tokens
+        for chunk in stream:
+            if chunk.content:
+                yield chunk.content
     except Exception as e:
         raise Exception(f"Error generating response with Gemini API: {str(e)}")
+    finally:
+        stream.close()
+
+def _messages_page(request, session):
+    """Read the pagination query parameters and return one page of the session's messages."""
+    limit = int(request.query_params.get('limit', MESSAGE_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    before = request.query_params.get('before')
+    after = request.query_params.get('after')
+    if before and after:
+        raise ValueError('Use either before or after, not both')
+    return list_chat_messages(session, min(limit, MAX_MESSAGE_PAGE_SIZE), before=before, after=after)
+
+def _document_metadata(session):
+    """Size metadata of a session's stored text."""
+    if session.text_storage != 'pages':
+        # Sessions created before out-of-line storage keep the text inline
+        load_session_fields(session, 'document_text')
+        text = session.document_text or ''
+        return {
+            'page_count': 1,
+            'text_size': len(text),
+            'text_hash': None,
+            'preview': session.document_preview
+        }
+    return {
+        'page_count': session.page_count,
+        'text_size': session.text_size,
+        'text_hash': session.text_hash,
+        'preview': session.document_preview
+    }
+
+def _session_clauses(session):
+    """
+    A session's clause table, segmenting and saving it for sessions created
+    before clause segmentation existed.
+    """
+    load_session_fields(session, *CLAUSE_FIELDS)
+    clauses = stored_clauses(session)
+    if clauses is None:
+        load_session_fields(session, 'document_text')
+        clauses = segment_clauses(read_full_text(session))
+        DocumentSession.objects(id=session.id).update_one(
+            **{f'set__{field}': value for field, value in clause_table(clauses).items()}
+        )
+    return clauses
+
+def _sse_event(event, data):
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -129,27 +200,6 @@ def summarize_document(request):
                 'error': 'File size exceeds 10MB limit.'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Reset file pointer to beginning for reading content
-        uploaded_file.seek(0)
-
-        try:
-            text = extract_text_from_file(uploaded_file)
-            if text is None:
-                return Response({
-                    'error': 'Error extracting text from file.'
-                }, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            return Response({
-                'error': f'Error extracting text from file: {str(e)}'
-            }, status=status.HTTP_400_BAD_REQUEST)
-            
-        if not text:
-            return Response({
-                'error': 'Unsupported file type. Please upload PDF, DOCX, or TXT'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        summary = summarize_legal_doc(text)
-        
         # Get user from JWT token (request.user is already a User object from MongoEngineJWTAuthentication)
         user = request.user
         
@@ -157,18 +207,20 @@ def summarize_document(request):
             return Response({
                 'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Create a new document session
-        session = DocumentSession(
-            user=user,
-            document_text=text[:10000],  # Store first 10k chars
-            summary=summary
-        )
-        session.save()
+
+        # Reset file pointer to beginning for reading content
+        uploaded_file.seek(0)
+
+        try:
+            session = process_document(user, uploaded_file.name, uploaded_file.read())
+        except DocumentProcessingError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
-            'summary': summary,
+            'summary': session.summary,
             'session_id': str(session.id),
             'filename': uploaded_file.name
         }, status=status.HTTP_201_CREATED)
@@ -178,6 +230,163 @@ def summarize_document(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def create_summarization_job(request):
+    """Queue a document for background summarization; poll the returned job for progress"""
+    try:
+        uploaded_file = request.FILES.get('document')
+        if not uploaded_file:
+            return Response({
+                'error': 'Please upload a document'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check file size (limit to 10MB)
+        if uploaded_file.size > 10 * 1024 * 1024:
+            return Response({
+                'error': 'File size exceeds 10MB limit.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        uploaded_file.seek(0)
+        job = submit_job(request.user, uploaded_file.name, uploaded_file.read())
+
+        return Response({
+            'job_id': str(job.id),
+            'status': job.status,
+            'filename': job.filename
+        }, status=status.HTTP_202_ACCEPTED)
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def summarization_job_status(request, job_id):
+    """Current stage and progress of a summarization job, with the session once it succeeds"""
+    try:
+        try:
+            object_id = ObjectId(job_id)
+        except (InvalidId, TypeError):
+            return Response({
+                'error': 'Job not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        job = SummarizationJob.objects(id=object_id, user=request.user).exclude('upload').no_dereference().first()
+        if not job:
+            return Response({
+                'error': 'Job not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        data = {
+            'job_id': str(job.id),
+            'filename': job.filename,
+            'status': job.status,
+            'stage': job.stage,
+            'progress': job.progress,
+            'error': job.error,
+            'created_at': job.created_at.isoformat(),
+            'updated_at': job.updated_at.isoformat()
+        }
+        if job.status == 'succeeded' and job.session:
+            session = DocumentSession.objects(id=job.session.id).only('id', 'summary').first()
+            data['session_id'] = str(job.session.id)
+            data['summary'] = session.summary if session else None
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _batch_files(request):
+    """The documents of a batch upload ('documents', repeatable; zips are expanded)."""
+    uploads = request.FILES.getlist('documents')
+    if not uploads:
+        raise DocumentProcessingError('Please upload at least one document')
+    return collect_batch_files(uploads)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def summarize_batch(request):
+    """
+    Summarize several documents (or zip archives of them) at once, streaming
+    a Server-Sent Event with each file's result as soon as it finishes
+    """
+    try:
+        try:
+            files, rejected = _batch_files(request)
+        except DocumentProcessingError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        results = process_batch(user, files)
+
+        def event_stream():
+            # Closing this generator on disconnect cancels the remaining files
+            succeeded = 0
+            try:
+                for result in rejected:
+                    yield _sse_event('result', result)
+                for result in results:
+                    succeeded += result['status'] == 'succeeded'
+                    yield _sse_event('result', result)
+            finally:
+                results.close()
+            yield _sse_event('done', {
+                'total': len(files) + len(rejected),
+                'succeeded': succeeded,
+                'failed': len(files) + len(rejected) - succeeded
+            })
+
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+        return response
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def create_summarization_jobs_batch(request):
+    """Queue several documents (or zip archives of them) as one summarization job per file"""
+    try:
+        try:
+            files, rejected = _batch_files(request)
+        except DocumentProcessingError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        jobs = [submit_job(request.user, filename, data) for filename, data in files]
+
+        return Response({
+            'jobs': [
+                {
+                    'job_id': str(job.id),
+                    'status': job.status,
+                    'filename': job.filename
+                }
+                for job in jobs
+            ],
+            'rejected': rejected
+        }, status=status.HTTP_202_ACCEPTED)
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 from django.views.decorators.csrf import csrf_exempt # Added csrf_exempt import
 
 # ...
@@ -205,20 +414,11 @@ def chat_message(request):
         
         # Get the document session and verify ownership
         try:
-            session = DocumentSession.objects(id=session_id).first()
-            if not session:
-                return Response({
-                    'error': 'Session not found'
-                }, status=status.HTTP_404_NOT_FOUND)
-                
-            if str(session.user.id) != str(user.id):
-                return Response({
-                    'error': 'Access denied'
-                }, status=status.HTTP_403_FORBIDDEN)
-        except DoesNotExist:
+            session = get_owned_session(session_id, user)
+        except SessionAccessError as e:
             return Response({
-                'error': 'Session not found'
-            }, status=status.HTTP_404_NOT_FOUND)
+                'error': e.message
+            }, status=e.status_code)
         
         # Save user message
         user_msg = ChatMessage(
@@ -229,7 +429,8 @@ def chat_message(request):
         user_msg.save()
         
         # Get AI response
-        ai_response = chat_with_document(session, user_message)
+        load_session_fields(session, 'document_text', 'summary', *MEMORY_FIELDS, *CLAUSE_FIELDS)
+        ai_response, passages, prompt_tokens = chat_with_document(session, user_message)
         
         # Save AI response
         ai_msg = ChatMessage(
@@ -238,10 +439,13 @@ def chat_message(request):
             is_user=False
         )
         ai_msg.save()
+        record_exchange(session, user_message, ai_response)
         
         return Response({
             'response': ai_response,
-            'message_id': str(ai_msg.id)
+            'message_id': str(ai_msg.id),
+            'passages': passages,
+            'prompt_tokens': prompt_tokens
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -249,11 +453,19 @@ def chat_message(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def chat_history(request, session_id):
-    """Get chat history for a session"""
+def chat_message_stream(request):
+    """Handle chat messages, streaming the answer as Server-Sent Events"""
     try:
+        user_message = request.data.get('message')
+        session_id = request.data.get('session_id')
+        
+        if not user_message or not session_id:
+            return Response({
+                'error': 'Missing message or session_id'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Get user from JWT token (request.user is already a User object)
         user = request.user
         
@@ -262,36 +474,94 @@ def chat_history(request, session_id):
                 'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
         
+        # Get the document session and verify ownership
         try:
-            session = DocumentSession.objects(id=session_id).first()
-            if not session:
-                return Response({
-                    'error': 'Session not found'
-                }, status=status.HTTP_404_NOT_FOUND)
+            session = get_owned_session(session_id, user)
+        except SessionAccessError as e:
+            return Response({
+                'error': e.message
+            }, status=e.status_code)
+        
+        # Save user message
+        user_msg = ChatMessage(
+            session=session,
+            message=user_message,
+            is_user=True
+        )
+        user_msg.save()
+        
+        load_session_fields(session, 'document_text', 'summary', *MEMORY_FIELDS, *CLAUSE_FIELDS)
+        answer = stream_chat_with_document(session, user_message)
+        
+        def event_stream():
+            # If the client disconnects, the server closes this generator,
+            # which closes `answer` and with it the upstream Gemini stream.
+            parts = []
+            try:
+                passages, prompt_tokens = next(answer)
+                yield _sse_event('passages', {'passages': passages, 'prompt_tokens': prompt_tokens})
+                for part in answer:
+                    parts.append(part)
+                    yield _sse_event('token', {'text': part})
+                if not "".join(parts).strip():
+                    yield _sse_event('error', {'error': 'The model returned an empty answer'})
+                    return
                 
-            if str(session.user.id) != str(user.id):
-                return Response({
-                    'error': 'Access denied'
-                }, status=status.HTTP_403_FORBIDDEN)
-        except DoesNotExist:
+                # Save AI response once the whole answer has been streamed
+                ai_msg = ChatMessage(
+                    session=session,
+                    message="".join(parts),
+                    is_user=False
+                )
+                ai_msg.save()
+                record_exchange(session, user_message, ai_msg.message)
+            except Exception as e:
+                yield _sse_event('error', {'error': str(e)})
+                return
+            finally:
+                answer.close()
+            yield _sse_event('done', {'message_id': str(ai_msg.id)})
+        
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+        return response
+        
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chat_history(request, session_id):
+    """Get chat history for a session, paginated with ?limit=, ?before= and ?after="""
+    try:
+        # Get user from JWT token (request.user is already a User object)
+        user = request.user
+        
+        if not user:
             return Response({
-                'error': 'Session not found'
+                'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            session = get_owned_session(session_id, user, 'summary')
+        except SessionAccessError as e:
+            return Response({
+                'error': e.message
+            }, status=e.status_code)
             
-        messages = ChatMessage.objects(session=session).order_by('created_at')
-        
-        messages_data = [
-            {
-                'id': str(msg.id),
-                'message': msg.message,
-                'is_user': msg.is_user,
-                'timestamp': msg.created_at.isoformat()
-            }
-            for msg in messages
-        ]
+        try:
+            messages_data, page = _messages_page(request, session)
+        except (ValueError, InvalidCursor) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'messages': messages_data,
+            'page': page,
             'session': {
                 'id': str(session.id),
                 'summary': session.summary,
@@ -307,7 +577,10 @@ def chat_history(request, session_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_sessions(request):
-    """Get user's document sessions"""
+    """
+    Get user's document sessions, newest first, paginated with ?limit= and
+    ?before=; the cursor of the next page is sent in the X-Next-Cursor header.
+    """
     try:
         # Get user from JWT token (request.user is already a User object)
         user = request.user
@@ -317,23 +590,25 @@ def user_sessions(request):
                 'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        sessions = DocumentSession.objects(user=user).order_by('-created_at')
+        try:
+            limit = min(int(request.query_params.get('limit', SESSION_PAGE_SIZE)), MAX_SESSION_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'error': 'limit must be a positive integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get message count for each session
-        sessions_data = []
-        for session in sessions:
-            message_count = ChatMessage.objects(session=session).count()
-            sessions_data.append({
-                'id': str(session.id),
-                'summary_preview': session.summary[:150] + '...' if len(session.summary) > 150 else session.summary,
-                'created_at': session.created_at.isoformat(),
-                'message_count': message_count,
-                'document_preview': session.document_text[:100] + '...' if len(session.document_text) > 100 else session.document_text
-            })
+        try:
+            sessions_data, next_cursor = list_user_sessions(user, limit, before=request.query_params.get('before'))
+        except InvalidCursor as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
+        return set_next_cursor(Response({
             'sessions': sessions_data
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), next_cursor)
         
     except Exception as e:
         return Response({
@@ -354,44 +629,169 @@ def session_detail(request, session_id):
             }, status=status.HTTP_404_NOT_FOUND)
         
         try:
-            session = DocumentSession.objects(id=session_id).first()
-            if not session:
-                return Response({
-                    'error': 'Session not found'
-                }, status=status.HTTP_404_NOT_FOUND)
-                
-            if str(session.user.id) != str(user.id):
-                return Response({
-                    'error': 'Access denied'
-                }, status=status.HTTP_403_FORBIDDEN)
-        except DoesNotExist:
+            session = get_owned_session(session_id, user, 'summary', 'document_preview')
+        except SessionAccessError as e:
             return Response({
-                'error': 'Session not found'
-            }, status=status.HTTP_404_NOT_FOUND)
+                'error': e.message
+            }, status=e.status_code)
             
-        chat_messages = ChatMessage.objects(session=session).order_by('created_at')
-        
-        messages_data = [
-            {
-                'id': str(msg.id),
-                'message': msg.message,
-                'is_user': msg.is_user,
-                'timestamp': msg.created_at.isoformat()
-            }
-            for msg in chat_messages
-        ]
+        try:
+            messages_data, page = _messages_page(request, session)
+        except (ValueError, InvalidCursor) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'session': {
                 'id': str(session.id),
                 'summary': session.summary,
-                'document_text': session.document_text,
-                'created_at': session.created_at.isoformat()
+                'created_at': session.created_at.isoformat(),
+                # The text itself is fetched in ranges from sessions/<id>/text/
+                'document': _document_metadata(session)
             },
-            'messages': messages_data
+            'messages': messages_data,
+            'page': page
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def document_cache_stats(request):
+    """Hit-rate counters and sizes of the extraction and summary caches"""
+    try:
+        return Response({
+            'cache': cache_stats()
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def session_text(request, session_id):
+    """
+    Read part of a session's document text, either by page
+    (?page=N&page_end=M, 1-based and inclusive) or by character offset
+    (?start=&end=, end exclusive).
+    """
+    try:
+        try:
+            session = get_owned_session(session_id, request.user, 'document_preview')
+        except SessionAccessError as e:
+            return Response({
+                'error': e.message
+            }, status=e.status_code)
+
+        metadata = _document_metadata(session)
+        params = request.query_params
+        try:
+            if 'page' in params:
+                first = int(params['page'])
+                last = int(params.get('page_end', first))
+                if first < 1 or last < first:
+                    raise ValueError('page and page_end must satisfy 1 <= page <= page_end')
+                last = min(last, first + MAX_TEXT_PAGES - 1)
+                pages = read_pages(session, first - 1, last - 1)
+                return Response({
+                    'pages': [dict(page, number=page['number'] + 1) for page in pages],
+                    'document': metadata
+                }, status=status.HTTP_200_OK)
+
+            start = int(params.get('start', 0))
+            end = int(params.get('end', start + MAX_TEXT_RANGE))
+            if start < 0 or end < start:
+                raise ValueError('start and end must satisfy 0 <= start <= end')
+            end = min(end, start + MAX_TEXT_RANGE, metadata['text_size'])
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'text': read_text_ranges(session, [(start, end)])[0] if end > start else '',
+            'start': start,
+            'end': max(start, end),
+            'document': metadata
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def session_clauses(request, session_id):
+    """The clause table of a session's document: id, kind, offsets and title of each clause"""
+    try:
+        try:
+            session = get_owned_session(session_id, request.user)
+        except SessionAccessError as e:
+            return Response({
+                'error': e.message
+            }, status=e.status_code)
+
+        clauses = _session_clauses(session)
+        # Titles are the first line of each clause, read in one pass over the pages
+        heads = read_text_ranges(session, [(start, min(end, start + 120)) for _, _, start, end in clauses])
+
+        return Response({
+            'clauses': [
+                {
+                    'id': clause_id,
+                    'kind': KINDS[kind],
+                    'start': start,
+                    'end': end,
+                    'title': head.split('\n', 1)[0][:80]
+                }
+                for (clause_id, kind, start, end), head in zip(clauses, heads)
+            ]
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def session_clause(request, session_id, clause_id):
+    """The text of one clause, with the ids of its neighbours for navigation"""
+    try:
+        try:
+            session = get_owned_session(session_id, request.user)
+        except SessionAccessError as e:
+            return Response({
+                'error': e.message
+            }, status=e.status_code)
+
+        clauses = _session_clauses(session)
+        ids = [clause[0] for clause in clauses]
+        if clause_id not in ids:
+            return Response({
+                'error': 'Clause not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        index = ids.index(clause_id)
+        _, kind, start, end = clauses[index]
+        return Response({
+            'id': clause_id,
+            'kind': KINDS[kind],
+            'start': start,
+            'end': end,
+            'text': read_text_ranges(session, [(start, end)])[0],
+            'previous': ids[index - 1] if index > 0 else None,
+            'next': ids[index + 1] if index + 1 < len(ids) else None
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,173 @@
+"""
+Line and word diffs between document versions.
+
+Lines are compared with Myers' O(ND) algorithm after trimming the common
+prefix and suffix, so the work grows with the size of the change rather
+than the size of the document. The number of edits explored is capped
+(VERSION_DIFF_MAX_EDITS): past it the changed region is reported as a
+single replacement, which keeps the time bounded for unrelated texts.
+Replaced lines that are small enough are diffed again word by word.
+
+A diff is a compact list of hunks; unchanged lines are only counted:
+
+    {"op": "=", "count": 12}
+    {"op": "-", "lines": [...]}
+    {"op": "+", "lines": [...]}
+    {"op": "~", "words": [["=", "The "], ["-", "Seller"], ["+", "Buyer"], ...]}
+    {"op": "~", "old": [...], "new": [...]}    (too large for a word diff)
+"""
+import re
+
+from django.conf import settings
+
+# Bump when the output changes, so cached diffs are recomputed
+DIFF_FORMAT_VERSION = 1
+
+TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+def _myers(a, b, max_edits):
+    """
+    The shortest edit script of a into b as (tag, i1, i2, j1, j2) opcodes,
+    tags being equal, delete and insert; None if it needs more than
+    max_edits insertions and deletions.
+    """
+    n, m = len(a), len(b)
+    offset = max_edits + 1
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(max_edits + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]  # Down: insertion
+            else:
+                x = v[offset + k - 1] + 1  # Right: deletion
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrack(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+
+def _backtrack(trace, n, m):
+    # trace[d][k + d] is the furthest x reached on diagonal k with d edits
+    steps = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = previous[previous_k + d - 1]
+        previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x, y = x - 1, y - 1
+            steps.append(('equal', x, y))
+        if x == previous_x:
+            y -= 1
+            steps.append(('insert', x, y))
+        else:
+            x -= 1
+            steps.append(('delete', x, y))
+    while x > 0 and y > 0:
+        x, y = x - 1, y - 1
+        steps.append(('equal', x, y))
+    steps.reverse()
+
+    opcodes = []
+    for tag, i, j in steps:
+        if opcodes and opcodes[-1][0] == tag:
+            _, i1, i2, j1, j2 = opcodes[-1]
+            opcodes[-1] = (tag, i1, i2 + (tag != 'insert'), j1, j2 + (tag != 'delete'))
+        else:
+            opcodes.append((tag, i, i + (tag != 'insert'), j, j + (tag != 'delete')))
+    return opcodes
+
+
+def diff_opcodes(a, b, max_edits):
+    """
+    difflib-style opcodes (equal, delete, insert, replace) turning sequence a
+    into b, and whether the edit limit was hit and the middle of the change
+    reported as one replacement.
+    """
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    middle_a, middle_b = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+
+    truncated = False
+    middle = _myers(middle_a, middle_b, max_edits)
+    if middle is None:
+        truncated = True
+        middle = [('replace', 0, len(middle_a), 0, len(middle_b))]
+
+    opcodes = [('equal', 0, prefix, 0, prefix)] if prefix else []
+    for tag, i1, i2, j1, j2 in middle:
+        i1, i2, j1, j2 = i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+        # Deletions next to insertions are a replacement
+        if opcodes and tag != 'equal' and opcodes[-1][0] != 'equal':
+            _, previous_i1, _, previous_j1, _ = opcodes[-1]
+            opcodes[-1] = ('replace', previous_i1, i2, previous_j1, j2)
+        elif i2 > i1 or j2 > j1:
+            opcodes.append((tag, i1, i2, j1, j2))
+    if suffix:
+        opcodes.append(('equal', len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return opcodes, truncated
+
+
+def _word_diff(old_lines, new_lines):
+    old = TOKEN.findall("".join(old_lines))
+    new = TOKEN.findall("".join(new_lines))
+    if len(old) + len(new) > settings.VERSION_WORD_DIFF_MAX_TOKENS:
+        return None
+    opcodes, truncated = diff_opcodes(old, new, settings.VERSION_DIFF_MAX_EDITS)
+    if truncated:
+        return None
+    words = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag in ('equal', 'delete', 'replace') and i2 > i1:
+            words.append(['=' if tag == 'equal' else '-', "".join(old[i1:i2])])
+        if tag in ('insert', 'replace') and j2 > j1:
+            words.append(['+', "".join(new[j1:j2])])
+    return words
+
+
+def diff_texts(old, new):
+    """The line and word diff of two texts, with line counts; see the module docstring for the hunks."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    opcodes, truncated = diff_opcodes(old_lines, new_lines, settings.VERSION_DIFF_MAX_EDITS)
+
+    hunks, added, removed = [], 0, 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            hunks.append({'op': '=', 'count': i2 - i1})
+            continue
+        removed += i2 - i1
+        added += j2 - j1
+        if tag == 'delete':
+            hunks.append({'op': '-', 'lines': old_lines[i1:i2]})
+        elif tag == 'insert':
+            hunks.append({'op': '+', 'lines': new_lines[j1:j2]})
+        else:
+            words = _word_diff(old_lines[i1:i2], new_lines[j1:j2])
+            if words is not None:
+                hunks.append({'op': '~', 'words': words})
+            else:
+                hunks.append({'op': '~', 'old': old_lines[i1:i2], 'new': new_lines[j1:j2]})
+    return {
+        'hunks': hunks,
+        'lines_added': added,
+        'lines_removed': removed,
+        'truncated': truncated,
+    }
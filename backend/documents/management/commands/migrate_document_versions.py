@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from documents.mongo_client import conversations_collection, migrate_embedded_versions
+
+
+class Command(BaseCommand):
+    help = "Move document versions embedded in conversations into the document_versions collection."
+
+    def handle(self, *args, **options):
+        conversations, versions = 0, 0
+        for conversation in conversations_collection().find({'document_versions': {'$exists': True}}, {'_id': 1}):
+            versions += migrate_embedded_versions(conversation['_id'])
+            conversations += 1
+        self.stdout.write(f"Moved {versions} version(s) of {conversations} conversation(s)")
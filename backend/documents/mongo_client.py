@@ -1,43 +1,303 @@
-from pymongo import MongoClient
+import hashlib
+
+import bson
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
 from django.conf import settings
-import certifi
 from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from legal_doc_generator.mongo import get_database
+from utils.pagination import encode_cursor, decode_cursor
+from documents.versions import make_delta, apply_delta, delta_size, is_snapshot, version_cache
+from documents.diffing import diff_texts, DIFF_FORMAT_VERSION
+from utils.search import index_document, remove_document, CONVERSATION
+from utils.compression import encode_text, decode_text
+
+PREVIEW_LENGTH = 200
+_indexes_created = False
+
+
+class MessageSequenceConflict(Exception):
+    """Raised when appended messages do not continue a conversation's message sequence."""
+
+    def __init__(self, message_seq):
+        super().__init__(f"Messages must continue after sequence number {message_seq}")
+        self.message_seq = message_seq
 
 
 def get_db():
-    mongo_uri = settings.MONGO_URI
-    if not mongo_uri:
+    """The shared database; its client is created on first use in each process."""
+    if not settings.MONGO_URI:
         raise Exception("MONGO_URI is not configured in your environment variables.")
-    client = MongoClient(mongo_uri, tlsCAFile=certifi.where())
-    db = client.get_default_database() # The database name is part of the connection string
-    return db
+    return get_database() # The database name is part of the connection string
+
+def _create_indexes(db):
+    global _indexes_created
+    # Keyset pagination of a user's conversations, newest first
+    db['conversations'].create_index([('owner_id', 1), ('created_at', -1), ('_id', -1)])
+    db['conversations'].create_index('document_versions.uploaded_by', sparse=True)
+    db['document_versions'].create_index([('conversation_id', 1), ('version_number', 1)], unique=True)
+    db['version_diffs'].create_index(
+        [('conversation_id', 1), ('from_version', 1), ('to_version', 1), ('format', 1)], unique=True
+    )
+    _indexes_created = True
+
+def conversations_collection():
+    db = get_db()
+    if not _indexes_created:
+        _create_indexes(db)
+    return db['conversations']
+
+def versions_collection():
+    """
+    Document versions, one per record, keyed by (conversation_id, version_number).
+    Conversations saved before this collection existed keep their versions
+    embedded in a document_versions array until they are next updated
+    (or migrated with the migrate_document_versions command).
+    """
+    db = get_db()
+    if not _indexes_created:
+        _create_indexes(db)
+    return db['document_versions']
+
+def diffs_collection():
+    """Computed diffs between two versions of a conversation; versions never change, so neither do their diffs."""
+    db = get_db()
+    if not _indexes_created:
+        _create_indexes(db)
+    return db['version_diffs']
+
+def _preview(content):
+    return content[:PREVIEW_LENGTH] + '...' if len(content) > PREVIEW_LENGTH else content
+
+def _version_summary(version, content=None):
+    """The denormalized latest_version of a conversation: the version's metadata and a preview, without its content."""
+    if content is None:
+        content = version.get('content', '')
+    return {
+        'version_number': version['version_number'],
+        'uploaded_at': version['uploaded_at'],
+        'size': len(content),
+        'preview': _preview(content),
+    }
+
+def _content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def _version_entry(conversation_id, version_number, content, uploaded_at, uploaded_by, notes):
+    """
+    A document version as stored: a delta against the previous version, or
+    the full text for snapshot versions and when the delta would not be smaller.
+    """
+    entry = {
+        'version_number': version_number,
+        'uploaded_at': uploaded_at,
+        'uploaded_by': uploaded_by,
+        'notes': notes,
+        'size': len(content),
+        'hash': _content_hash(content),
+    }
+    if conversation_id is not None and version_number > 0 and not is_snapshot(version_number):
+        previous = get_document_version_content(conversation_id, version_number - 1)
+        if previous is not None:
+            delta = make_delta(previous, content)
+            if delta_size(delta) < len(content):
+                entry['delta'] = delta
+                return entry
+    entry['content'] = content
+    return entry
+
+def _stored_version(entry, conversation_id):
+    """The record of a version in the versions collection, its full text compressed when large enough."""
+    record = dict(entry, conversation_id=conversation_id)
+    if 'content' in record:
+        record['content'] = encode_text(record['content'])
+    return record
 
-db = get_db()
-conversations_collection = db['conversations']
+def _load_versions(conversation_id, low, high):
+    """The stored entries of versions low..high of a conversation, in version order."""
+    versions = list(
+        versions_collection()
+        .find(
+            {'conversation_id': ObjectId(conversation_id), 'version_number': {'$gte': low, '$lte': high}},
+            {'_id': 0, 'conversation_id': 0},
+        )
+        .sort('version_number', 1)
+    )
+    if versions:
+        return versions
 
-def get_all_conversations():
-    """Fetches all conversations, returning the id, title, created_at, and the latest document content."""
+    # Not migrated yet: the versions are still embedded in the conversation
+    result = list(conversations_collection().aggregate([
+        {'$match': {'_id': ObjectId(conversation_id), 'document_versions': {'$exists': True}}},
+        {'$project': {'document_versions': {'$filter': {
+            'input': '$document_versions',
+            'as': 'version',
+            'cond': {'$and': [
+                {'$gte': ['$$version.version_number', low]},
+                {'$lte': ['$$version.version_number', high]},
+            ]},
+        }}}},
+    ]))
+    if not result:
+        return []
+    return sorted(result[0].get('document_versions') or [], key=lambda version: version['version_number'])
+
+def migrate_embedded_versions(conversation_id):
+    """
+    Move a conversation's embedded document_versions into the versions
+    collection and start its version counter after them. Safe to run
+    concurrently and more than once. Returns the number of versions moved.
+    """
+    conversation = conversations_collection().find_one(
+        {'_id': ObjectId(conversation_id), 'document_versions': {'$exists': True}},
+        {'document_versions': 1},
+    )
+    if not conversation:
+        return 0
+    versions = sorted(conversation.get('document_versions') or [], key=lambda version: version['version_number'])
+    if versions:
+        records, content = [], ''
+        for version in versions:
+            content = apply_delta(content, version['delta']) if 'delta' in version else version['content']
+            records.append(_stored_version(
+                dict(version, size=len(content), hash=_content_hash(content)), conversation['_id']
+            ))
+        try:
+            versions_collection().insert_many(records, ordered=False)
+        except BulkWriteError as e:
+            # Versions another process already moved
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+    fields = {'version_counter': {'$ifNull': [
+        '$version_counter',
+        {'$add': [{'$ifNull': [{'$max': '$document_versions.version_number'}, -1]}, 1]},
+    ]}}
+    # The conversation list finds unowned conversations through their versions'
+    # uploaders, so they become owned by whoever created the first version
+    if versions and versions[0].get('uploaded_by'):
+        owner = get_db()['users'].find_one({'username': versions[0]['uploaded_by']}, {'_id': 1})
+        if owner:
+            fields['owner_id'] = {'$ifNull': ['$owner_id', owner['_id']]}
+    conversations_collection().update_one({'_id': conversation['_id']}, [
+        {'$set': fields},
+        {'$unset': 'document_versions'},
+    ])
+    return len(versions)
+
+def _allocate_version_number(conversation_id):
+    """The next version number of a conversation, reserved atomically; None if it does not exist."""
+    migrate_embedded_versions(conversation_id)
+    conversation = conversations_collection().find_one_and_update(
+        {'_id': ObjectId(conversation_id)},
+        {'$inc': {'version_counter': 1}},
+        projection={'version_counter': 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return conversation['version_counter'] - 1 if conversation else None
+
+def _expand_versions(conversation_id, versions):
+    """Replace the deltas of a full, ordered list of versions with their contents."""
+    content = ''
+    for version in versions:
+        if 'delta' in version:
+            content = apply_delta(content, version.pop('delta'))
+        else:
+            content = decode_text(version['content'])
+        version['content'] = content
+        version_cache.put((conversation_id, version['version_number']), content)
+    return versions
+
+def _owner_query(owner_id, username):
+    # Conversations saved before owner_id existed are matched by the username that uploaded them
+    return {'$or': [
+        {'owner_id': owner_id},
+        {'owner_id': {'$exists': False}, 'document_versions.uploaded_by': username},
+    ]}
+
+def owns_conversation(conversation_id, owner_id, username):
+    """Whether the conversation exists and belongs to the user, matched as in get_all_conversations."""
     try:
-        conversations = conversations_collection.find({}, {'title': 1, 'created_at': 1, 'document_versions': 1})
-        # Convert ObjectId to string for JSON serialization and get latest document
-        result = []
-        for conv in conversations:
-            conv['_id'] = str(conv['_id'])
-            if 'document_versions' in conv and conv['document_versions']:
-                conv['latest_document'] = conv['document_versions'][-1]['content']
-            else:
-                conv['latest_document'] = ''
-            result.append(conv)
-        return result
+        object_id = ObjectId(conversation_id)
+    except (InvalidId, TypeError):
+        return False
+    query = {'$and': [{'_id': object_id}, _owner_query(owner_id, username)]}
+    return conversations_collection().count_documents(query, limit=1) > 0
+
+def get_all_conversations(owner_id, username, limit, before=None):
+    """
+    One page of a user's conversations, newest first: id, title, dates and a
+    preview of the latest document version. Returns the conversations and the
+    cursor of the next page (or None).
+
+    Only the denormalized latest_version summary is read; conversations saved
+    before it existed fall back to a $slice of their last version and are
+    matched by the username that uploaded them.
+    """
+    query = _owner_query(owner_id, username)
+    if before:
+        created_at, object_id = decode_cursor(before)
+        query = {'$and': [query, {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': object_id}},
+        ]}]}
+
+    try:
+        conversations = list(
+            conversations_collection()
+            .find(query, {
+                'title': 1,
+                'created_at': 1,
+                'updated_at': 1,
+                'latest_version': 1,
+                'document_versions': {'$slice': -1},
+            })
+            .sort([('created_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+        )
     except Exception as e:
-        print(f"Error fetching all conversations: {e}")
-        return []
+        print(f"Error fetching conversations: {e}")
+        return [], None
+
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        next_cursor = encode_cursor(conversations[-1]['created_at'], conversations[-1]['_id'])
 
-def get_conversation_by_id(conversation_id):
-    """Fetches a single conversation by its ID."""
+    result = []
+    for conv in conversations:
+        latest = conv.get('latest_version')
+        if latest is None and conv.get('document_versions'):
+            latest = _version_summary(conv['document_versions'][-1])
+        result.append({
+            '_id': str(conv['_id']),
+            'title': conv.get('title'),
+            'created_at': conv.get('created_at'),
+            'updated_at': conv.get('updated_at'),
+            'latest_version_number': latest['version_number'] if latest else None,
+            'preview': latest['preview'] if latest else '',
+        })
+    return result, next_cursor
+
+def get_conversation_by_id(conversation_id, versions=True):
+    """Fetches a single conversation by its ID; without its messages and document versions unless versions is true."""
     try:
-        conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
+        # owner_id is an ObjectId and only used for access checks, which query it themselves
+        projection = {'version_counter': 0, 'owner_id': 0}
+        if not versions:
+            projection.update(messages=0, document_versions=0)
+        conversation = conversations_collection().find_one({'_id': ObjectId(conversation_id)}, projection)
+        if conversation and versions:
+            if 'document_versions' in conversation:
+                conversation['document_versions'].sort(key=lambda version: version['version_number'])
+            else:
+                conversation['document_versions'] = list(
+                    versions_collection()
+                    .find({'conversation_id': conversation['_id']}, {'_id': 0, 'conversation_id': 0})
+                    .sort('version_number', 1)
+                )
+            _expand_versions(str(conversation['_id']), conversation['document_versions'])
         if conversation:
             conversation['_id'] = str(conversation['_id'])
         return conversation
@@ -45,99 +305,345 @@ def get_conversation_by_id(conversation_id):
         print(f"Error fetching conversation by ID: {e}")
         return None
 
-def save_conversation(title, messages, initial_document_content=None, uploaded_by=None, notes=None):
+def _numbered(messages, start=1):
+    """Messages with their sequence numbers, counting from start."""
+    return [dict(message, seq=start + i) for i, message in enumerate(messages)]
+
+def save_conversation(title, messages, initial_document_content=None, uploaded_by=None, notes=None, owner_id=None):
     """Saves a new conversation to the database, creating the first document version."""
     current_time = datetime.utcnow()
-    document_versions = []
+    initial_version = None
     if initial_document_content is not None:
-        document_versions.append({
-            'version_number': 0, # Initial version is 0
-            'content': initial_document_content,
-            'uploaded_at': current_time,
-            'uploaded_by': uploaded_by,
-            'notes': notes or 'Initial Document',
-        })
+        # Initial version is 0, always stored in full
+        initial_version = _version_entry(
+            None, 0, initial_document_content, current_time, uploaded_by, notes or 'Initial Document'
+        )
 
     try:
         conversation_doc = {
             'title': title,
-            'messages': messages,
-            'document_versions': document_versions,
+            'messages': _numbered(messages),
+            'message_seq': len(messages),
+            'latest_version': _version_summary(initial_version) if initial_version else None,
+            'version_counter': 1 if initial_version else 0,
+            'owner_id': owner_id,
             'created_at': current_time,
             'updated_at': current_time,
         }
-        result = conversations_collection.insert_one(conversation_doc)
+        result = conversations_collection().insert_one(conversation_doc)
+        if initial_version:
+            versions_collection().insert_one(_stored_version(initial_version, result.inserted_id))
+        index_document(CONVERSATION, result.inserted_id, owner_id, title=title, content=initial_document_content or '')
         print(f"[DEBUG] New conversation saved with ID: {result.inserted_id}")
-        if document_versions:
-            print(f"[DEBUG] Initial version (0) content length: {len(document_versions[0]['content'])}")
+        if initial_version:
+            print(f"[DEBUG] Initial version (0) content length: {len(initial_version['content'])}")
         return str(result.inserted_id)
     except Exception as e:
         print(f"Error saving conversation: {e}")
         return None
 
 def update_conversation(conversation_id, title, messages, new_document_content=None, uploaded_by=None, notes=None):
-    """Updates an existing conversation, appending a new document version."""
+    """
+    Updates an existing conversation, appending a new document version.
+    messages, when not None, replace the whole transcript; append_messages
+    adds to it instead.
+    """
     current_time = datetime.utcnow()
-    update_doc = {
-        '$set': {
-            'title': title,
-            'messages': messages,
-            'updated_at': current_time,
-        }
-    }
-
-    existing_conv = get_conversation_by_id(conversation_id)
     print(f"[DEBUG] update_conversation called for ID: {conversation_id}")
-    print(f"[DEBUG] Existing conversation found: {bool(existing_conv)}")
-
-    if existing_conv:
-        # Determine the next version number
-        next_version_number = 0
-        if 'document_versions' in existing_conv and existing_conv['document_versions']:
-            next_version_number = max(v['version_number'] for v in existing_conv['document_versions']) + 1
-        print(f"[DEBUG] Next version number: {next_version_number}")
-        
-        # Append the new document content as a new version
-        if new_document_content is not None:
-            new_version_entry = {
-                'version_number': next_version_number,
-                'content': new_document_content,
-                'uploaded_at': current_time,
-                'uploaded_by': uploaded_by,
-                'notes': notes or f'Version {next_version_number} update',
-            }
-            update_doc['$push'] = {'document_versions': new_version_entry}
-            print(f"[DEBUG] Pushing new version entry: Version {new_version_entry['version_number']}, Content length: {len(new_version_entry['content'])}")
-        else:
-            print("[DEBUG] new_document_content is None, not pushing new version.")
+    fields = {'title': title, 'updated_at': current_time}
+    if messages is not None:
+        fields['messages'] = _numbered(messages)
+        fields['message_seq'] = len(messages)
 
     try:
-        result = conversations_collection.update_one({'_id': ObjectId(conversation_id)}, update_doc)
-        print(f"[DEBUG] MongoDB update result: Matched {result.matched_count}, Modified {result.modified_count}")
+        conversation = conversations_collection().find_one_and_update(
+            {'_id': ObjectId(conversation_id)}, {'$set': fields}, projection={'owner_id': 1}
+        )
+        print(f"[DEBUG] Existing conversation found: {bool(conversation)}")
+        if conversation:
+            index_document(
+                CONVERSATION, conversation_id, conversation.get('owner_id'),
+                title=title, content=new_document_content,
+            )
+
+        if new_document_content is None:
+            print("[DEBUG] new_document_content is None, not adding a new version.")
+            return True
+        # The counter hands out each number once, even to concurrent saves
+        version_number = _allocate_version_number(conversation_id)
+        if version_number is None:
+            print("[DEBUG] Conversation not found, not adding a new version.")
+            return True
+
+        # Append the new document content as a new version
+        entry = _version_entry(
+            conversation_id, version_number, new_document_content, current_time,
+            uploaded_by, notes or f'Version {version_number} update',
+        )
+        versions_collection().insert_one(_stored_version(entry, ObjectId(conversation_id)))
+        version_cache.put((str(conversation_id), version_number), new_document_content)
+        # A slower concurrent save of an older version must not overwrite a newer summary
+        conversations_collection().update_one(
+            {'_id': ObjectId(conversation_id), '$or': [
+                {'latest_version': None},
+                {'latest_version.version_number': {'$lt': version_number}},
+            ]},
+            {'$set': {'latest_version': _version_summary(entry, new_document_content)}},
+        )
+        print(f"[DEBUG] Added version {version_number}, {'delta' if 'delta' in entry else 'snapshot'}, Content length: {len(new_document_content)}")
         return True
     except Exception as e:
         print(f"Error updating conversation: {e}")
         return False
 
+def _number_legacy_messages(conversation_id):
+    # Conversations saved before sequence numbers existed get theirs in place
+    messages = {'$ifNull': ['$messages', []]}
+    conversations_collection().update_one(
+        {'_id': ObjectId(conversation_id), 'message_seq': {'$exists': False}},
+        [{'$set': {
+            'messages': {'$map': {
+                'input': {'$range': [0, {'$size': messages}]},
+                'as': 'i',
+                'in': {'$mergeObjects': [{'$arrayElemAt': [messages, '$$i']}, {'seq': {'$add': ['$$i', 1]}}]},
+            }},
+            'message_seq': {'$size': messages},
+        }}],
+    )
+
+def _same_message(stored, message):
+    # A client-supplied id identifies a message; otherwise its whole content does
+    if 'id' in stored and 'id' in message:
+        return stored['id'] == message['id']
+    return {k: v for k, v in stored.items() if k != 'seq'} == {k: v for k, v in message.items() if k != 'seq'}
+
+def _check_overlap(conversation_id, messages):
+    """Raise MessageSequenceConflict unless messages match the stored messages with the same seq."""
+    seqs = [message['seq'] for message in messages]
+    result = list(conversations_collection().aggregate([
+        {'$match': {'_id': ObjectId(conversation_id)}},
+        {'$project': {
+            'message_seq': 1,
+            'messages': {'$filter': {
+                'input': {'$ifNull': ['$messages', []]},
+                'as': 'message',
+                'cond': {'$in': ['$$message.seq', seqs]},
+            }},
+        }},
+    ]))
+    if not result:
+        return
+    stored = {message['seq']: message for message in result[0]['messages']}
+    for message in messages:
+        if message['seq'] not in stored or not _same_message(stored[message['seq']], message):
+            raise MessageSequenceConflict(result[0]['message_seq'])
+
+def append_messages(conversation_id, messages, retries=3):
+    """
+    Append messages to a conversation's transcript with a single $push.
+
+    Each message carries the client's sequence number (seq), counting from 1
+    in the order of the transcript. Messages already stored are skipped when
+    they match the stored ones (by "id" when both have one, by content
+    otherwise), so a retried request is harmless; a different message with
+    a stored seq, or a gap, raises MessageSequenceConflict with the stored
+    sequence number. Returns the conversation's sequence number after the
+    append, or None if the conversation does not exist.
+    """
+    messages = sorted(messages, key=lambda message: message['seq'])
+    _number_legacy_messages(conversation_id)
+    for _ in range(retries):
+        conversation = conversations_collection().find_one({'_id': ObjectId(conversation_id)}, {'message_seq': 1})
+        if not conversation:
+            return None
+        message_seq = conversation['message_seq']
+        overlap = [message for message in messages if message['seq'] <= message_seq]
+        if overlap:
+            # Another client may have stored different messages under these numbers
+            _check_overlap(conversation_id, overlap)
+        new_messages = [message for message in messages if message['seq'] > message_seq]
+        if not new_messages:
+            return message_seq
+        if any(message['seq'] != message_seq + 1 + i for i, message in enumerate(new_messages)):
+            raise MessageSequenceConflict(message_seq)
+
+        # Only applies if no other append got in since message_seq was read
+        result = conversations_collection().update_one(
+            {'_id': conversation['_id'], 'message_seq': message_seq},
+            {
+                '$push': {'messages': {'$each': new_messages}},
+                '$set': {'message_seq': new_messages[-1]['seq'], 'updated_at': datetime.utcnow()},
+            },
+        )
+        if result.modified_count:
+            return new_messages[-1]['seq']
+    raise MessageSequenceConflict(message_seq)
+
+def get_messages_since(conversation_id, since=0):
+    """
+    The messages of a conversation with a sequence number above since, and
+    the conversation's latest sequence number; None if it does not exist.
+    """
+    try:
+        result = list(conversations_collection().aggregate([
+            {'$match': {'_id': ObjectId(conversation_id)}},
+            {'$project': {
+                'message_seq': 1,
+                'messages': {'$filter': {
+                    'input': {'$ifNull': ['$messages', []]},
+                    'as': 'message',
+                    'cond': {'$gt': ['$$message.seq', since]},
+                }},
+            }},
+        ]))
+    except Exception as e:
+        print(f"Error fetching messages: {e}")
+        return None
+    if not result:
+        return None
+    if 'message_seq' not in result[0]:
+        # Saved before sequence numbers existed: number them and read again
+        _number_legacy_messages(conversation_id)
+        return get_messages_since(conversation_id, since)
+    return result[0]['messages'], result[0]['message_seq']
+
 def delete_conversation(conversation_id):
-    """Deletes a conversation from the database."""
+    """Deletes a conversation and its document versions from the database."""
     try:
-        conversations_collection.delete_one({'_id': ObjectId(conversation_id)})
+        conversations_collection().delete_one({'_id': ObjectId(conversation_id)})
+        versions_collection().delete_many({'conversation_id': ObjectId(conversation_id)})
+        diffs_collection().delete_many({'conversation_id': ObjectId(conversation_id)})
+        remove_document(CONVERSATION, conversation_id)
         return True
     except Exception as e:
         print(f"Error deleting conversation: {e}")
         return False
 
-def get_document_version_content(conversation_id, version_number):
-    """Retrieves the content of a specific document version from a conversation."""
+def list_document_versions(conversation_id):
+    """
+    Metadata of a conversation's document versions, oldest first: number,
+    upload time, author, notes, size and content hash, without contents.
+    Returns None if the conversation does not exist.
+    """
     try:
-        conversation = conversations_collection.find_one(
+        conversation = conversations_collection().find_one(
             {'_id': ObjectId(conversation_id)},
-            {'document_versions': {'$elemMatch': {'version_number': version_number}}}
+            {'document_versions': 1},
+        )
+        if not conversation:
+            return None
+        if 'document_versions' in conversation:
+            # Not migrated yet: sizes and hashes are computed from the embedded contents
+            versions = sorted(conversation['document_versions'], key=lambda version: version['version_number'])
+            _expand_versions(str(conversation['_id']), versions)
+            for version in versions:
+                content = version.pop('content')
+                version['size'] = len(content)
+                version['hash'] = _content_hash(content)
+            return versions
+        return list(
+            versions_collection()
+            .find({'conversation_id': conversation['_id']}, {'_id': 0, 'conversation_id': 0, 'content': 0, 'delta': 0})
+            .sort('version_number', 1)
         )
-        if conversation and 'document_versions' in conversation and conversation['document_versions']:
-            return conversation['document_versions'][0]['content']
+    except Exception as e:
+        print(f"Error listing document versions: {e}")
         return None
+
+def _rebuild_version(conversation_id, version_number):
+    """Content of a delta-encoded version, from the closest earlier version that is cached or stored in full."""
+    start, base = version_number - 1, None
+    while start > 0:
+        base = version_cache.get((conversation_id, start))
+        if base is not None or is_snapshot(start):
+            break
+        start -= 1
+    if base is not None:
+        chain = [{'version_number': start, 'content': base}] + _load_versions(conversation_id, start + 1, version_number)
+    else:
+        chain = _load_versions(conversation_id, start, version_number)
+        if not chain or 'delta' in chain[0]:
+            # The snapshot interval changed since these versions were written
+            chain = _load_versions(conversation_id, 0, version_number)
+    return _expand_versions(conversation_id, chain)[-1]['content']
+
+def get_document_version_content(conversation_id, version_number):
+    """
+    Retrieves the content of a specific document version from a conversation,
+    applying its delta (and those of the versions back to the nearest snapshot
+    or cached version) when it is not stored in full.
+    """
+    conversation_id = str(conversation_id)
+    content = version_cache.get((conversation_id, version_number))
+    if content is not None:
+        return content
+    try:
+        versions = _load_versions(conversation_id, version_number, version_number)
+        if not versions:
+            return None
+        version = versions[0]
+        if 'delta' in version:
+            return _rebuild_version(conversation_id, version_number)
+        content = decode_text(version['content'])
+        version_cache.put((conversation_id, version_number), content)
+        return content
     except Exception as e:
         print(f"Error retrieving document version content: {e}")
         return None
+
+def get_latest_document(conversation_id):
+    """The title, latest version number and latest document content of a conversation, or None if it has no versions."""
+    try:
+        result = list(conversations_collection().aggregate([
+            {'$match': {'_id': ObjectId(conversation_id)}},
+            {'$project': {
+                'title': 1,
+                # Conversations saved before latest_version existed
+                'version_number': {'$ifNull': ['$latest_version.version_number', {'$max': '$document_versions.version_number'}]},
+            }},
+        ]))
+    except Exception as e:
+        print(f"Error fetching latest document: {e}")
+        return None
+    if not result or result[0].get('version_number') is None:
+        return None
+    content = get_document_version_content(conversation_id, result[0]['version_number'])
+    if content is None:
+        return None
+    return {'title': result[0].get('title'), 'version_number': result[0]['version_number'], 'content': content}
+
+def get_version_diff(conversation_id, from_version, to_version):
+    """
+    The diff between two document versions of a conversation (see
+    documents.diffing), computed once and then served from version_diffs,
+    unless it is over VERSION_DIFF_CACHE_MAX_BYTES. Returns None if either
+    version does not exist.
+    """
+    key = {
+        'conversation_id': ObjectId(conversation_id),
+        'from_version': from_version,
+        'to_version': to_version,
+        'format': DIFF_FORMAT_VERSION,
+    }
+    cached = diffs_collection().find_one(key, {'diff': 1})
+    if cached:
+        return cached['diff']
+
+    old = get_document_version_content(conversation_id, from_version)
+    new = get_document_version_content(conversation_id, to_version)
+    if old is None or new is None:
+        return None
+    diff = diff_texts(old, new)
+    # Diffs of unrelated versions carry both texts; those are not worth storing
+    if len(bson.encode({'diff': diff})) > settings.VERSION_DIFF_CACHE_MAX_BYTES:
+        return diff
+    try:
+        diffs_collection().update_one(
+            key, {'$setOnInsert': {'diff': diff, 'created_at': datetime.utcnow()}}, upsert=True
+        )
+    except DuplicateKeyError:
+        pass  # Stored by a concurrent request
+    except Exception as e:
+        # The diff is still good; it just gets computed again next time
+        print(f"Error caching version diff: {e}")
+    return diff
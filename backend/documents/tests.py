@@ -1,3 +1,200 @@
-from django.test import TestCase
+import random
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .versions import make_delta, apply_delta, delta_size, VersionCache
+from .diffing import diff_opcodes, diff_texts
+from . import views
+
+
+def _edited(rng, lines):
+    """A copy of lines with a few random lines deleted, replaced or inserted."""
+    lines = list(lines)
+    for _ in range(rng.randrange(0, 6)):
+        position = rng.randrange(0, len(lines) + 1)
+        action = rng.choice(('delete', 'replace', 'insert'))
+        if action != 'insert' and position < len(lines):
+            del lines[position]
+        if action != 'delete':
+            lines.insert(position, f"Clause {rng.randrange(100)} was amended.\n")
+    return lines
+
+
+class DeltaTests(SimpleTestCase):
+    def test_round_trip_of_random_edits(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            old_lines = [f"{rng.choice('abc')} line {rng.randrange(20)}\n" for _ in range(rng.randrange(0, 15))]
+            old = "".join(old_lines)
+            new = "".join(_edited(rng, old_lines))
+            # Texts may or may not end with a newline
+            if new and rng.random() < 0.3:
+                new = new[:-1]
+            with self.subTest(old=old, new=new):
+                self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+
+    def test_empty_texts(self):
+        for old, new in (("", ""), ("", "One line\n"), ("One line\n", ""), ("No newline", "No newline")):
+            with self.subTest(old=old, new=new):
+                self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+
+    def test_small_edit_is_smaller_than_the_text(self):
+        old = "".join(f"{number}. The Tenant shall pay the rent on time.\n" for number in range(200))
+        new = old.replace("17. The Tenant", "17. The Landlord")
+        self.assertLess(delta_size(make_delta(old, new)), len(new) // 10)
+
+
+class VersionCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = VersionCache(2)
+        cache.put(('c', 1), "one")
+        cache.put(('c', 2), "two")
+        cache.get(('c', 1))
+        cache.put(('c', 3), "three")
+        self.assertIsNone(cache.get(('c', 2)))
+        self.assertEqual(cache.get(('c', 1)), "one")
+        self.assertEqual(cache.get(('c', 3)), "three")
+
+
+def _lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def _apply_opcodes(a, b, opcodes):
+    """Rebuild b from the opcodes, checking that they cover both sequences in order."""
+    result, i, j = [], 0, 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j), "opcodes are not contiguous"
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2], "equal opcode over different items"
+            result.extend(a[i1:i2])
+        else:
+            result.extend(b[j1:j2])
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b)), "opcodes do not reach the end"
+    return result
+
+
+def _apply_hunks(old, hunks):
+    """The new text from the old text and diff_texts hunks."""
+    old_lines = old.splitlines(keepends=True)
+    parts, position = [], 0
+    for hunk in hunks:
+        if hunk['op'] == '=':
+            parts.extend(old_lines[position:position + hunk['count']])
+            position += hunk['count']
+        elif hunk['op'] == '-':
+            position += len(hunk['lines'])
+        elif hunk['op'] == '+':
+            parts.extend(hunk['lines'])
+        elif 'words' in hunk:
+            removed = "".join(text for op, text in hunk['words'] if op != '+')
+            position += len(removed.splitlines(keepends=True))
+            parts.extend(text for op, text in hunk['words'] if op != '-')
+        else:
+            position += len(hunk['old'])
+            parts.extend(hunk['new'])
+    return "".join(parts)
+
+
+@override_settings(VERSION_DIFF_MAX_EDITS=1000, VERSION_WORD_DIFF_MAX_TOKENS=4000)
+class DiffTests(SimpleTestCase):
+    def test_opcodes_are_a_shortest_edit_script(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            a = [rng.choice('abcd') for _ in range(rng.randrange(0, 12))]
+            b = [rng.choice('abcd') for _ in range(rng.randrange(0, 12))]
+            opcodes, truncated = diff_opcodes(a, b, 1000)
+            with self.subTest(a="".join(a), b="".join(b)):
+                self.assertFalse(truncated)
+                self.assertEqual(_apply_opcodes(a, b, opcodes), b)
+                edits = sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+                self.assertEqual(edits, len(a) + len(b) - 2 * _lcs_length(a, b))
+
+    def test_edit_limit_reports_one_replacement(self):
+        a, b = list("abcdefgh"), list("a12345h")
+        opcodes, truncated = diff_opcodes(a, b, 2)
+        self.assertTrue(truncated)
+        self.assertEqual(opcodes, [('equal', 0, 1, 0, 1), ('replace', 1, 7, 1, 6), ('equal', 7, 8, 6, 7)])
+        self.assertEqual(_apply_opcodes(a, b, opcodes), b)
+
+    def test_hunks_rebuild_the_new_text(self):
+        rng = random.Random(1)
+        for _ in range(500):
+            old_lines = [f"{rng.choice('abc')} line {rng.randrange(20)}\n" for _ in range(rng.randrange(0, 15))]
+            old = "".join(old_lines)
+            new = "".join(_edited(rng, old_lines))
+            with self.subTest(old=old, new=new):
+                diff = diff_texts(old, new)
+                self.assertEqual(_apply_hunks(old, diff['hunks']), new)
+
+    def test_unchanged_lines_are_only_counted(self):
+        old = "".join(f"Line {number}\n" for number in range(100))
+        new = old.replace("Line 50\n", "Line fifty\n")
+        diff = diff_texts(old, new)
+        self.assertEqual([hunk['op'] for hunk in diff['hunks']], ['=', '~', '='])
+        self.assertEqual(diff['hunks'][1]['words'], [['=', 'Line '], ['-', '50'], ['+', 'fifty'], ['=', '\n']])
+        self.assertEqual((diff['lines_added'], diff['lines_removed']), (1, 1))
+
+
+class _FakeCollection:
+    """Just enough of a pymongo collection for find_one by _id with an exclusion projection."""
+
+    def __init__(self, *documents):
+        self.documents = documents
+
+    def find_one(self, query, projection=None):
+        for document in self.documents:
+            if all(document.get(key) == value for key, value in query.items()):
+                return {key: value for key, value in document.items() if (projection or {}).get(key, 1)}
+        return None
+
+
+class ConversationDetailTests(SimpleTestCase):
+    def test_detail_response_renders(self):
+        owner = mock.Mock(is_authenticated=True, id=ObjectId(), username='alice')
+        conversation = {
+            '_id': ObjectId(),
+            'title': 'Lease',
+            'owner_id': owner.id,
+            'messages': [],
+            'version_counter': 1,
+            'created_at': datetime(2026, 1, 1),
+            'document_versions': [
+                {'version_number': 1, 'content': 'The Tenant shall pay the rent.', 'uploaded_by': 'alice'},
+            ],
+        }
+        request = APIRequestFactory().get(f"/documents/conversations/{conversation['_id']}/")
+        force_authenticate(request, user=owner)
+        with mock.patch('documents.mongo_client.conversations_collection', return_value=_FakeCollection(conversation)), \
+                mock.patch('documents.views.owns_conversation', return_value=True):
+            response = views.conversation_detail(request, str(conversation['_id']))
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['document_versions'][0]['content'], 'The Tenant shall pay the rent.')
+        self.assertNotIn('owner_id', response.data)
+
+    def test_other_users_conversation_is_not_found(self):
+        factory = APIRequestFactory()
+        pk = str(ObjectId())
+        requests = [factory.get(f"/documents/conversations/{pk}/"), factory.delete(f"/documents/conversations/{pk}/"),
+                    factory.put(f"/documents/conversations/{pk}/", {'title': 'Mine now'}, format='json')]
+        with mock.patch('documents.views.owns_conversation', return_value=False), \
+                mock.patch('documents.views.update_conversation') as update, \
+                mock.patch('documents.views.delete_conversation') as delete:
+            for request in requests:
+                force_authenticate(request, user=mock.Mock(is_authenticated=True, id=ObjectId(), username='mallory'))
+                with self.subTest(method=request.method):
+                    self.assertEqual(views.conversation_detail(request, pk).status_code, 404)
+        update.assert_not_called()
+        delete.assert_not_called()
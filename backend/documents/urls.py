@@ -4,5 +4,8 @@ from . import views
 urlpatterns = [
     path('conversations/', views.conversation_list, name='conversation-list'),
     path('conversations/<str:pk>/', views.conversation_detail, name='conversation-detail'),
+    path('conversations/<str:pk>/messages/', views.conversation_messages, name='conversation-messages'),
+    path('conversations/<str:pk>/versions/', views.conversation_versions, name='conversation-versions'),
     path('conversations/<str:pk>/versions/<int:version_number>/content/', views.get_version_content, name='get-version-content'),
+    path('conversations/<str:pk>/versions/<int:from_version>/diff/<int:to_version>/', views.version_diff, name='version-diff'),
 ]
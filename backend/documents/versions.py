@@ -0,0 +1,88 @@
+"""
+Delta encoding of document versions.
+
+A conversation's versions are mostly small AI edits of the same Markdown,
+so instead of the full text each version stores a line diff against the
+previous version. Every DOCUMENT_SNAPSHOT_INTERVAL versions (and whenever
+the diff would not be smaller) the full text is stored instead, which
+bounds the number of diffs applied to rebuild any version.
+
+A delta is a list of operations applied to the previous version's lines:
+
+    n > 0   copy the next n lines
+    n < 0   skip the next -n lines
+    "..."   insert this text
+"""
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+
+def make_delta(old, new):
+    """Line delta turning old into new."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    delta = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append("".join(new_lines[j1:j2]))
+    return delta
+
+
+def apply_delta(old, delta):
+    """Inverse of make_delta: the new text from old and the delta."""
+    old_lines = old.splitlines(keepends=True)
+    parts, position = [], 0
+    for operation in delta:
+        if isinstance(operation, str):
+            parts.append(operation)
+        elif operation > 0:
+            parts.extend(old_lines[position:position + operation])
+            position += operation
+        else:
+            position -= operation
+    return "".join(parts)
+
+
+def delta_size(delta):
+    """Rough stored size of a delta, to compare against the full text."""
+    return sum(len(operation) if isinstance(operation, str) else 4 for operation in delta)
+
+
+def is_snapshot(version_number):
+    return version_number % settings.DOCUMENT_SNAPSHOT_INTERVAL == 0
+
+
+class VersionCache:
+    """A thread-safe LRU of reconstructed version contents, keyed by (conversation_id, version_number)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+            return content
+
+    def put(self, key, content):
+        # Versions never change once written, so entries never go stale
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+version_cache = VersionCache(settings.DOCUMENT_VERSION_CACHE_SIZE)
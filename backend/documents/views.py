@@ -1,17 +1,41 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from documents.mongo_client import get_all_conversations, get_conversation_by_id, save_conversation, update_conversation, delete_conversation, get_document_version_content
+from documents.mongo_client import get_all_conversations, get_conversation_by_id, save_conversation, update_conversation, delete_conversation, get_document_version_content, list_document_versions, get_version_diff, append_messages, get_messages_since, MessageSequenceConflict, owns_conversation
+from utils.pagination import InvalidCursor, set_next_cursor
 
+CONVERSATION_PAGE_SIZE = 50
+MAX_CONVERSATION_PAGE_SIZE = 100
+
+
+def _owned(request, pk):
+    # A conversation of another user answers 404, as if it did not exist
+    return owns_conversation(pk, request.user.id, request.user.username)
 
 @api_view(['GET', 'POST'])
 def conversation_list(request):
     """
-    List all conversations or create a new one.
+    List the user's conversations or create a new one.
+
+    The list is newest first and paginated with ?limit= and ?before=; the
+    cursor of the next page is sent in the X-Next-Cursor header.
     """
     if request.method == 'GET':
-        conversations = get_all_conversations()
-        return Response(conversations)
+        try:
+            limit = min(int(request.query_params.get('limit', CONVERSATION_PAGE_SIZE)), MAX_CONVERSATION_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            conversations, next_cursor = get_all_conversations(
+                request.user.id, request.user.username, limit, before=request.query_params.get('before')
+            )
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return set_next_cursor(Response(conversations), next_cursor)
 
     elif request.method == 'POST':
         title = request.data.get('title')
@@ -24,7 +48,7 @@ def conversation_list(request):
         if not title or not messages:
             return Response({'error': 'Title and messages are required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        conversation_id = save_conversation(title, messages, initial_document_content, uploaded_by=(request.user.username if request.user.is_authenticated else 'anonymous'), notes=notes)
+        conversation_id = save_conversation(title, messages, initial_document_content, uploaded_by=(request.user.username if request.user.is_authenticated else 'anonymous'), notes=notes, owner_id=request.user.id)
         if conversation_id:
             return Response({'id': conversation_id}, status=status.HTTP_201_CREATED)
         else:
@@ -35,6 +59,8 @@ def conversation_detail(request, pk):
     """
     Retrieve, update or delete a single conversation.
     """
+    if not _owned(request, pk):
+        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
     if request.method == 'GET':
         conversation = get_conversation_by_id(pk)
         if conversation:
@@ -43,6 +69,7 @@ def conversation_detail(request, pk):
             return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
     
     elif request.method == 'PUT':
+        # messages may be left out when they are synced through conversation_messages
         title = request.data.get('title')
         messages = request.data.get('messages')
         new_document_content = request.data.get('new_document_content')
@@ -50,7 +77,7 @@ def conversation_detail(request, pk):
 
         print(f"[DEBUG Backend] conversation_detail (PUT) - Received messages: {messages}")
 
-        if not title or not messages:
+        if not title or (messages is not None and not messages):
             return Response({'error': 'Title and messages are required'}, status=status.HTTP_400_BAD_REQUEST)
         
         success = update_conversation(pk, title, messages, new_document_content, uploaded_by=(request.user.username if request.user.is_authenticated else 'anonymous'), notes=notes)
@@ -66,20 +93,93 @@ def conversation_detail(request, pk):
         else:
             return Response({'error': 'Failed to delete conversation'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET', 'POST'])
+def conversation_messages(request, pk):
+    """
+    Incremental message sync.
+
+    GET returns the messages after ?since=<seq> and the latest sequence
+    number. POST appends {"messages": [...]}, each message carrying its
+    sequence number as "seq"; messages already stored are skipped, and a
+    gap or a different message under a stored sequence number answers 409
+    with the stored sequence number.
+    """
+    try:
+        if not _owned(request, pk):
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'GET':
+            try:
+                since = int(request.query_params.get('since', 0))
+            except ValueError:
+                return Response({'error': 'since must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            result = get_messages_since(pk, since)
+            if result is None:
+                return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+            messages, message_seq = result
+            return Response({'messages': messages, 'message_seq': message_seq})
+
+        messages = request.data.get('messages')
+        if not isinstance(messages, list) or not messages:
+            return Response({'error': 'messages must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if any(
+            not isinstance(message, dict) or not isinstance(message.get('seq'), int) or message['seq'] < 1
+            for message in messages
+        ):
+            return Response({'error': 'Every message needs a positive integer seq'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            message_seq = append_messages(pk, messages)
+        except MessageSequenceConflict as e:
+            return Response({'error': str(e), 'message_seq': e.message_seq}, status=status.HTTP_409_CONFLICT)
+        if message_seq is None:
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message_seq': message_seq}, status=status.HTTP_200_OK)
+    except Exception as e:
+        print(f"Error in conversation_messages: {e}")
+        return Response({'error': f'Error syncing messages: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def conversation_versions(request, pk):
+    """
+    Lists the document versions of a conversation: number, upload time,
+    author, notes, size and hash, without their contents.
+    """
+    if not _owned(request, pk):
+        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    versions = list_document_versions(pk)
+    if versions is None:
+        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(versions)
+
 @api_view(['GET'])
 def get_version_content(request, pk, version_number):
     """
     Retrieves the content of a specific document version from a conversation.
     """
     try:
-        conversation = get_conversation_by_id(pk)
-        if not conversation or 'document_versions' not in conversation or not conversation['document_versions']:
-            return Response({'error': 'No document versions found for this conversation.'}, status=status.HTTP_404_NOT_FOUND)
-        
-        version = next((v for v in conversation['document_versions'] if v['version_number'] == version_number), None)
-        if version:
-            return Response({'content': version['content']}, status=status.HTTP_200_OK)
-        return Response({'error': 'Version content not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not _owned(request, pk):
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        content = get_document_version_content(pk, version_number)
+        if content is None:
+            return Response({'error': 'Version content not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'content': content}, status=status.HTTP_200_OK)
     except Exception as e:
         print(f"Error in get_version_content: {e}")
-        return Response({'error': f'Error retrieving version content: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': f'Error retrieving version content: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def version_diff(request, pk, from_version, to_version):
+    """
+    Line and word diff between two document versions of a conversation.
+    Unchanged lines are only counted, so the response stays small.
+    """
+    try:
+        if not _owned(request, pk):
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        diff = get_version_diff(pk, from_version, to_version)
+        if diff is None:
+            return Response({'error': 'Version content not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'from_version': from_version, 'to_version': to_version, **diff}, status=status.HTTP_200_OK)
+    except Exception as e:
+        print(f"Error in version_diff: {e}")
+        return Response({'error': f'Error computing version diff: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
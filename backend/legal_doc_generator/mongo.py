@@ -0,0 +1,162 @@
+"""
+The one MongoDB connection pool of a process.
+
+MongoEngine and the raw pymongo code (documents.mongo_client) share a
+single MongoClient, registered from settings with register_connection()
+and created lazily by MongoEngine on first use. Nothing connects at
+import time, so manage.py commands that never touch the database never
+connect, and under gunicorn each worker creates its own client after
+the fork. Should a client exist before a fork anyway, the child drops its
+copy and lazily creates a fresh one.
+
+This module is imported from settings, so it must not import Django.
+"""
+import os
+import threading
+
+import certifi
+import mongoengine
+from mongoengine import connection as mongoengine_connection
+from mongoengine.connection import DEFAULT_CONNECTION_NAME
+from pymongo import monitoring
+
+_lock = threading.Lock()
+_options = {}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events of this process's client."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        with _lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.check_outs = 0
+            self.check_out_failures = 0
+            self.check_out_wait_ms = 0.0
+            self.max_check_out_wait_ms = 0.0
+            self.pools_cleared = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with _lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with _lock:
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with _lock:
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with _lock:
+            self.check_out_failures += 1
+
+    def connection_checked_out(self, event):
+        # duration (seconds) is reported by pymongo 4.7 and later
+        wait_ms = (getattr(event, 'duration', None) or 0.0) * 1000
+        with _lock:
+            self.check_outs += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.check_out_wait_ms += wait_ms
+            self.max_check_out_wait_ms = max(self.max_check_out_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with _lock:
+            self.checked_out -= 1
+
+
+pool_listener = PoolStatsListener()
+
+
+def register_connection(uri, **options):
+    """
+    Register the shared connection with MongoEngine without connecting.
+    options are MongoClient keyword arguments (maxPoolSize, timeouts, ...).
+    """
+    options = {name: value for name, value in options.items() if value is not None}
+    if uri.startswith('mongodb+srv://') or 'tls=true' in uri.lower() or 'ssl=true' in uri.lower():
+        options.setdefault('tlsCAFile', certifi.where())
+    _options.clear()
+    _options.update(options)
+    mongoengine.register_connection(
+        DEFAULT_CONNECTION_NAME,
+        host=uri,
+        event_listeners=[pool_listener],
+        **options,
+    )
+
+
+def get_client():
+    """The process's MongoClient, created on first use."""
+    return mongoengine.get_connection()
+
+
+def get_database():
+    """The default database of the connection string, on the shared client."""
+    return mongoengine_connection.get_db()
+
+
+def _reset_after_fork():
+    # The parent's client must not be used (or closed) in the child: forget
+    # it, along with the collections MongoEngine cached from it, and let the
+    # next query create a fresh client in this process.
+    global _lock
+    from mongoengine import Document
+    from mongoengine.base.common import _get_documents_by_db
+
+    _lock = threading.Lock()  # It may have been held by another thread at fork time
+    mongoengine_connection._connections.pop(DEFAULT_CONNECTION_NAME, None)
+    if DEFAULT_CONNECTION_NAME in mongoengine_connection._dbs:
+        for document_class in _get_documents_by_db(DEFAULT_CONNECTION_NAME, DEFAULT_CONNECTION_NAME):
+            if issubclass(document_class, Document):
+                document_class._disconnect()
+        del mongoengine_connection._dbs[DEFAULT_CONNECTION_NAME]
+    pool_listener.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def pool_stats():
+    """Connection pool counters of this process, with the configured pool limits."""
+    with _lock:
+        check_outs = pool_listener.check_outs
+        return {
+            'pid': os.getpid(),
+            'connected': DEFAULT_CONNECTION_NAME in mongoengine_connection._connections,
+            'max_pool_size': _options.get('maxPoolSize', 100),  # pymongo's default
+            'min_pool_size': _options.get('minPoolSize', 0),
+            'connections_open': pool_listener.created - pool_listener.closed,
+            'connections_created': pool_listener.created,
+            'connections_closed': pool_listener.closed,
+            'checked_out': pool_listener.checked_out,
+            'max_checked_out': pool_listener.max_checked_out,
+            'check_outs': check_outs,
+            'check_out_failures': pool_listener.check_out_failures,
+            'avg_check_out_wait_ms': round(pool_listener.check_out_wait_ms / check_outs, 2) if check_outs else 0.0,
+            'max_check_out_wait_ms': round(pool_listener.max_check_out_wait_ms, 2),
+            'pools_cleared': pool_listener.pools_cleared,
+        }
@@ -48,7 +48,7 @@ CORS_ALLOWED_ORIGINS = [
     "https://doc-gen-iota.vercel.app",
     
 ]
-CORS_EXPOSE_HEADERS = ['Content-Disposition']
+CORS_EXPOSE_HEADERS = ['Content-Disposition', 'X-Next-Cursor']
 
 
 # Application definition
@@ -168,6 +168,87 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
+# Shared LLM gateway (utils.llm_gateway)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 8))
+LLM_METRICS_WINDOW = int(os.getenv("LLM_METRICS_WINDOW", 500))
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+LLM_WARMUP_PING = os.getenv("LLM_WARMUP_PING", "false").lower() == "true"
+
+# Prompt token budgets (utils.prompt_builder); lower-priority context is trimmed to fit
+SUMMARY_PROMPT_TOKENS = int(os.getenv("SUMMARY_PROMPT_TOKENS", 4000))
+CHAT_PROMPT_TOKENS = int(os.getenv("CHAT_PROMPT_TOKENS", 4000))
+GENERATOR_PROMPT_TOKENS = int(os.getenv("GENERATOR_PROMPT_TOKENS", 24000))
+
+# Document text extraction
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", os.cpu_count() or 1))
+PDF_EXTRACTION_PAGE_TIMEOUT = float(os.getenv("PDF_EXTRACTION_PAGE_TIMEOUT", 5))
+PDF_EXTRACTION_BATCH_SIZE = int(os.getenv("PDF_EXTRACTION_BATCH_SIZE", 16))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 48))
+
+# Summarization: documents longer than one chunk are summarized map-reduce style
+SUMMARY_CHUNK_SIZE = int(os.getenv("SUMMARY_CHUNK_SIZE", 10000))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 4))
+
+# Document chat retrieves the top-k passages relevant to each question
+CHAT_PASSAGE_SIZE = int(os.getenv("CHAT_PASSAGE_SIZE", 1200))
+CHAT_TOP_K_PASSAGES = int(os.getenv("CHAT_TOP_K_PASSAGES", 4))
+CHAT_MEMORY_WINDOW = int(os.getenv("CHAT_MEMORY_WINDOW", 6))  # Recent messages kept verbatim
+CHAT_MEMORY_SUMMARY_CHARS = int(os.getenv("CHAT_MEMORY_SUMMARY_CHARS", 2000))
+CHAT_MEMORY_LINE_CHARS = int(os.getenv("CHAT_MEMORY_LINE_CHARS", 200))
+
+# Near-duplicate uploads (MinHash/LSH per user) reuse an earlier summary and only
+# re-summarize the clauses that differ. DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.95))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", 128))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", 16))
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", 5))
+# Longer documents are signed over this many of their shingles (the smallest hashes)
+DEDUP_MAX_SHINGLES = int(os.getenv("DEDUP_MAX_SHINGLES", 2000))
+
+# Extracted text is stored out of line in compressed pages of at most this many characters
+DOCUMENT_TEXT_PAGE_SIZE = int(os.getenv("DOCUMENT_TEXT_PAGE_SIZE", 8000))
+
+# Large text fields (summaries, chat messages, document versions, ...) are stored
+# compressed from this many characters on; an optional shared dictionary trained
+# with train_compression_dictionary improves the ratio of shorter values. The
+# directory keeps every dictionary ever trained (<id>.dict): the newest is used
+# for writes, older ones are still needed to read what they compressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 512))
+COMPRESSION_DICTIONARY_DIR = os.getenv("COMPRESSION_DICTIONARY_DIR") or None
+
+# Conversation document versions are stored as line deltas against the previous
+# version, with the full text every DOCUMENT_SNAPSHOT_INTERVAL versions
+DOCUMENT_SNAPSHOT_INTERVAL = int(os.getenv("DOCUMENT_SNAPSHOT_INTERVAL", 10))
+DOCUMENT_VERSION_CACHE_SIZE = int(os.getenv("DOCUMENT_VERSION_CACHE_SIZE", 256))
+
+# Version diffs: edits explored before a changed region is reported as one
+# replacement, the largest replacement (in words) that is diffed word by word, and
+# the largest diff (in BSON bytes) kept in version_diffs; bigger ones are recomputed
+VERSION_DIFF_MAX_EDITS = int(os.getenv("VERSION_DIFF_MAX_EDITS", 1000))
+VERSION_WORD_DIFF_MAX_TOKENS = int(os.getenv("VERSION_WORD_DIFF_MAX_TOKENS", 4000))
+VERSION_DIFF_CACHE_MAX_BYTES = int(os.getenv("VERSION_DIFF_CACHE_MAX_BYTES", 1024 * 1024))
+
+# Full-text search over conversations and summarized documents
+SEARCH_MAX_INDEXED_CHARS = int(os.getenv("SEARCH_MAX_INDEXED_CHARS", 100000))
+SEARCH_SNIPPET_LENGTH = int(os.getenv("SEARCH_SNIPPET_LENGTH", 200))
+
+# Content-addressed cache for extracted text and summaries
+DOCUMENT_CACHE_TTL = int(os.getenv("DOCUMENT_CACHE_TTL", 30 * 24 * 60 * 60))
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", 5000))
+
+# Background summarization jobs
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", 2))
+SUMMARY_JOB_STALE_AFTER = int(os.getenv("SUMMARY_JOB_STALE_AFTER", 10 * 60))
+
+# Batch uploads: documents are extracted in parallel and summarized a few at a time
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 50))
+BATCH_MAX_TOTAL_SIZE = int(os.getenv("BATCH_MAX_TOTAL_SIZE", 200 * 1024 * 1024))
+BATCH_SUMMARY_CONCURRENCY = int(os.getenv("BATCH_SUMMARY_CONCURRENCY", 4))
+
 # Cloudinary configuration
 import cloudinary
 cloudinary.config(
@@ -179,10 +260,28 @@ cloudinary.config(
 
 # MongoDB configuration
 MONGO_URI = os.getenv("MONGO_URI")
+# One client per process, shared by MongoEngine and pymongo code and created
+# on first use (legal_doc_generator.mongo); timeouts are in milliseconds
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS")) if os.getenv("MONGO_SOCKET_TIMEOUT_MS") else None
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
 
 if MONGO_URI:
-    import mongoengine
-    mongoengine.connect(host=MONGO_URI)
+    from legal_doc_generator.mongo import register_connection
+    register_connection(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    )
 
 AUTHENTICATION_BACKENDS = ['authentication.backends.EmailBackend']
 
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class UtilsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'utils'
+
+    def ready(self):
+        # Build the shared LLM clients when each worker process starts
+        if settings.LLM_WARMUP and settings.GEMINI_API_KEY:
+            from utils import llm_gateway
+            llm_gateway.warm_up()
@@ -0,0 +1,159 @@
+"""
+Compression for large text stored in MongoDB.
+
+Compressed values start with a one-byte codec tag so data written with one
+codec stays readable after the default changes. zstd is used when the
+optional ``zstandard`` package is installed, zlib otherwise.
+
+With COMPRESSION_DICTIONARY_DIR set, both codecs prime the compressor
+with a shared dictionary trained on legal text (see the
+train_compression_dictionary command), which matters most for the short
+values a general-purpose compressor has too little context for. Values
+compressed with a dictionary carry its id after the tag and are read back
+with the dictionary of that id from the directory, so every dictionary
+ever used must stay there; only the newest one is used for writes.
+
+encode_text and decode_text are the field-level layer: text under
+COMPRESSION_MIN_SIZE characters is stored as a plain string, larger text
+as compressed bytes, and either form reads back as a string.
+"""
+import os
+import struct
+import zlib
+
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+ZLIB = b'z'
+ZSTD = b's'
+ZLIB_DICTIONARY = b'Z'
+ZSTD_DICTIONARY = b'S'
+
+DICTIONARY_SUFFIX = '.dict'
+
+# Dictionaries of COMPRESSION_DICTIONARY_DIR by id, and the id of the newest
+# one, loaded on first use
+_dictionaries = None
+_current_id = None
+
+
+def dictionary_id(data):
+    return zlib.crc32(data)
+
+
+def _load_dictionaries():
+    global _dictionaries, _current_id
+    dictionaries, newest = {}, None
+    directory = getattr(settings, 'COMPRESSION_DICTIONARY_DIR', None)
+    if directory and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if not filename.endswith(DICTIONARY_SUFFIX):
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            dict_id = dictionary_id(data)
+            dictionaries[dict_id] = data
+            modified = os.path.getmtime(path)
+            if newest is None or modified > newest[0]:
+                newest = (modified, dict_id)
+    _dictionaries = dictionaries
+    _current_id = newest[1] if newest else None
+
+
+def load_dictionary():
+    """The dictionary new values are compressed with as (id, bytes), or None."""
+    if _dictionaries is None:
+        _load_dictionaries()
+    if _current_id is None:
+        return None
+    return _current_id, _dictionaries[_current_id]
+
+
+def get_dictionary(dict_id):
+    """The dictionary with the given id as bytes, or None when it is not in the directory."""
+    if _dictionaries is None or dict_id not in _dictionaries:
+        # Another process may have trained a new dictionary since we looked
+        _load_dictionaries()
+    return _dictionaries.get(dict_id)
+
+
+def _zstd_dictionary(data):
+    return zstandard.ZstdCompressionDict(data)
+
+
+def compress_text(text, level=6, dictionary=None):
+    """
+    Compress a string to tagged bytes, with the configured dictionary unless
+    another (id, bytes) dictionary is given, or False for none.
+    """
+    data = text.encode('utf-8')
+    if dictionary is None:
+        dictionary = load_dictionary()
+    if not dictionary:
+        if zstandard is not None:
+            return ZSTD + zstandard.ZstdCompressor(level=level).compress(data)
+        return ZLIB + zlib.compress(data, level)
+
+    dict_id, dict_data = dictionary
+    header = struct.pack('>I', dict_id)
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=level, dict_data=_zstd_dictionary(dict_data))
+        return ZSTD_DICTIONARY + header + compressor.compress(data)
+    compressor = zlib.compressobj(level, zdict=dict_data)
+    return ZLIB_DICTIONARY + header + compressor.compress(data) + compressor.flush()
+
+
+def decompress_text(blob, dictionary=None):
+    """
+    Inverse of compress_text. Dictionary-compressed data is read with the
+    given (id, bytes) dictionary when the ids match, otherwise with the
+    dictionary of its id from COMPRESSION_DICTIONARY_DIR.
+    """
+    blob = bytes(blob)
+    tag, payload = blob[:1], blob[1:]
+    if tag == ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if tag == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed data found but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    if tag in (ZLIB_DICTIONARY, ZSTD_DICTIONARY):
+        (dict_id,), payload = struct.unpack('>I', payload[:4]), payload[4:]
+        if dictionary and dictionary[0] == dict_id:
+            dict_data = dictionary[1]
+        else:
+            dict_data = get_dictionary(dict_id)
+        if dict_data is None:
+            raise RuntimeError(f"Data was compressed with dictionary {dict_id:08x}, which is not configured")
+        if tag == ZLIB_DICTIONARY:
+            decompressor = zlib.decompressobj(zdict=dict_data)
+            return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed data found but the zstandard package is not installed")
+        decompressor = zstandard.ZstdDecompressor(dict_data=_zstd_dictionary(dict_data))
+        return decompressor.decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown compression tag: {tag!r}")
+
+
+def encode_text(text):
+    """
+    A string as it is stored: unchanged when shorter than
+    COMPRESSION_MIN_SIZE characters or when compressing does not make it
+    smaller, compressed bytes otherwise.
+    """
+    if not isinstance(text, str) or len(text) < settings.COMPRESSION_MIN_SIZE:
+        return text
+    blob = compress_text(text)
+    return blob if len(blob) < len(text.encode('utf-8')) else text
+
+
+def decode_text(value):
+    """Inverse of encode_text: strings pass through, compressed bytes are decompressed."""
+    if isinstance(value, (bytes, bytearray)):
+        return decompress_text(value)
+    return value
@@ -0,0 +1,25 @@
+from mongoengine import StringField
+
+from utils.compression import encode_text, decode_text
+
+
+class CompressedStringField(StringField):
+    """
+    A StringField stored compressed once it reaches COMPRESSION_MIN_SIZE
+    characters (see utils.compression.encode_text). Documents see plain
+    strings; values written before the field was compressed stay readable.
+    """
+
+    def to_python(self, value):
+        return super().to_python(decode_text(value))
+
+    def to_mongo(self, value):
+        return encode_text(self.to_python(value))
+
+    def prepare_query_value(self, op, value):
+        # Updates (set__summary=...) store the same form as save(); queries
+        # on the contents cannot match compressed values and are not used
+        if op in ('set', 'setOnInsert'):
+            self.validate(value)
+            return self.to_mongo(value)
+        return super().prepare_query_value(op, value)
@@ -0,0 +1,205 @@
+"""
+Process-wide access to the Gemini models.
+
+Clients are created once per process and reused by every request, keyed
+by model and temperature (or system instruction for the google-generativeai
+models). Calls go through call_with_retry, which applies jittered
+exponential backoff to transient errors and records per-call latency
+and estimated prompt size.
+"""
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+import google.generativeai as genai
+from django.conf import settings
+from google.api_core import exceptions as google_exceptions
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from .prompt_builder import estimate_tokens
+
+DEFAULT_CHAT_MODEL = "gemini-2.0-flash-exp"
+DEFAULT_GENERATOR_MODEL = "models/gemini-2.5-flash-lite"
+
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+_lock = threading.Lock()
+_configured = False
+_chat_clients = {}
+_generative_models = {}
+
+# Most recent latencies per call name, in milliseconds
+_latencies = defaultdict(lambda: deque(maxlen=settings.LLM_METRICS_WINDOW))
+_calls = defaultdict(int)
+_errors = defaultdict(int)
+_prompts = defaultdict(int)
+_prompt_tokens = defaultdict(int)
+
+
+def configure():
+    """Configure the google-generativeai SDK once per process."""
+    global _configured
+    if _configured:
+        return
+    with _lock:
+        if not _configured:
+            if not settings.GEMINI_API_KEY:
+                raise ValueError("GEMINI_API_KEY is not configured in settings")
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            _configured = True
+
+
+def _record(name, started, failed=False):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        _latencies[name].append(elapsed_ms)
+        _calls[name] += 1
+        if failed:
+            _errors[name] += 1
+
+
+def record_prompt_tokens(name, tokens):
+    """Record the estimated token count of a prompt sent under name."""
+    with _lock:
+        _prompts[name] += 1
+        _prompt_tokens[name] += tokens
+
+
+def call_with_retry(name, func, *args, **kwargs):
+    """
+    Call func, retrying transient API errors with jittered exponential
+    backoff. Every attempt's latency is recorded under name.
+    """
+    attempts = settings.LLM_MAX_RETRIES + 1
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except TRANSIENT_ERRORS:
+            _record(name, started, failed=True)
+            if attempt == attempts - 1:
+                raise
+            delay = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt)
+            time.sleep(random.uniform(0, delay))  # Full jitter
+        except Exception:
+            _record(name, started, failed=True)
+            raise
+        else:
+            _record(name, started)
+            return result
+
+
+class ChatClient:
+    """A pooled LangChain chat model whose calls are retried and timed."""
+
+    def __init__(self, model, temperature):
+        self.model = model
+        self.temperature = temperature
+        self.name = f"{model}@{temperature}"
+        self.llm = ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            google_api_key=settings.GEMINI_API_KEY,  # Explicitly pass API key
+            timeout=settings.LLM_TIMEOUT,
+            max_retries=1,  # Retries are handled by call_with_retry
+        )
+
+    def invoke(self, prompt):
+        record_prompt_tokens(self.name, estimate_tokens(prompt))
+        return call_with_retry(self.name, self.llm.invoke, prompt)
+
+    def stream(self, prompt):
+        """
+        Stream the response. Streams are not retried; the recorded latency
+        is the time until the stream is exhausted or closed.
+        """
+        record_prompt_tokens(f"{self.name}:stream", estimate_tokens(prompt))
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield from self.llm.stream(prompt)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _record(f"{self.name}:stream", started, failed=failed)
+
+
+def get_chat_client(model=DEFAULT_CHAT_MODEL, temperature=0.3):
+    """Return the shared ChatClient for a model and temperature."""
+    key = (model, temperature)
+    client = _chat_clients.get(key)
+    if client is None:
+        configure()
+        with _lock:
+            client = _chat_clients.get(key)
+            if client is None:
+                client = _chat_clients[key] = ChatClient(model, temperature)
+    return client
+
+
+def get_generative_model(model=DEFAULT_GENERATOR_MODEL, system_instruction=None):
+    """Return the shared google-generativeai model for a model and system instruction."""
+    key = (model, system_instruction)
+    generative_model = _generative_models.get(key)
+    if generative_model is None:
+        configure()
+        with _lock:
+            generative_model = _generative_models.get(key)
+            if generative_model is None:
+                generative_model = _generative_models[key] = genai.GenerativeModel(
+                    model,
+                    system_instruction=system_instruction,
+                )
+    return generative_model
+
+
+def request_options():
+    """Per-call options for google-generativeai requests."""
+    return {'timeout': settings.LLM_TIMEOUT}
+
+
+def warm_up():
+    """Create the default clients up front so the first request does not pay for it."""
+    try:
+        get_chat_client(DEFAULT_CHAT_MODEL, 0.3)
+        if settings.LLM_WARMUP_PING:
+            get_chat_client(DEFAULT_CHAT_MODEL, 0.3).invoke("ping")
+    except Exception as e:
+        print(f"LLM gateway warm-up failed: {e}")
+
+
+def latency_metrics():
+    """
+    Call and error counts per call name, with latency percentiles (ms)
+    over the most recent LLM_METRICS_WINDOW calls and the average
+    estimated prompt size in tokens.
+    """
+    with _lock:
+        snapshot = {name: sorted(samples) for name, samples in _latencies.items()}
+        calls = dict(_calls)
+        errors = dict(_errors)
+        prompts = dict(_prompts)
+        prompt_tokens = dict(_prompt_tokens)
+    metrics = {}
+    for name, samples in snapshot.items():
+        if not samples:
+            continue
+        metrics[name] = {
+            'calls': calls.get(name, 0),
+            'errors': errors.get(name, 0),
+            'avg_ms': round(sum(samples) / len(samples), 1),
+            'p50_ms': round(samples[len(samples) // 2], 1),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+            'max_ms': round(samples[-1], 1),
+            'avg_prompt_tokens': round(prompt_tokens[name] / prompts[name]) if prompts.get(name) else None,
+        }
+    return metrics
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from document_summarizer.models import (
+    DocumentSession, ChatMessage, SummaryCacheEntry, ExtractionCacheEntry,
+    make_preview, SUMMARY_PREVIEW_LENGTH, DOCUMENT_PREVIEW_LENGTH,
+)
+from documents.mongo_client import versions_collection
+from utils.compression import encode_text
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Compress the large text fields of existing documents, which new writes already store compressed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how much would be saved')
+
+    def _compress(self, collection, field, dry_run, preview=None):
+        """
+        Compress field in every document of collection that still stores it
+        as a string. preview is the (field, length) of a listing preview of it.
+        """
+        compressed, before, after, batch = 0, 0, 0, []
+        projection = [field, preview[0]] if preview else [field]
+        for document in collection.find({field: {'$type': 'string'}}, projection):
+            value = document[field]
+            encoded = encode_text(value)
+            if isinstance(encoded, str):
+                continue
+            compressed += 1
+            before += len(value.encode('utf-8'))
+            after += len(encoded)
+            fields = {field: encoded}
+            # Listings slice the text when a preview is missing, which a compressed value cannot serve
+            if preview and document.get(preview[0]) is None:
+                fields[preview[0]] = make_preview(value, preview[1])
+            batch.append(UpdateOne({'_id': document['_id'], field: value}, {'$set': fields}))
+            if len(batch) >= BATCH_SIZE and not dry_run:
+                collection.bulk_write(batch, ordered=False)
+                batch = []
+        if batch and not dry_run:
+            collection.bulk_write(batch, ordered=False)
+
+        saved = f" ({before / after:.1f}x)" if after else ""
+        self.stdout.write(
+            f"{collection.name}.{field}: {compressed} value(s), {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB{saved}"
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        sessions = DocumentSession._get_collection()
+        self._compress(sessions, 'summary', dry_run, ('summary_preview', SUMMARY_PREVIEW_LENGTH))
+        self._compress(sessions, 'document_text', dry_run, ('document_preview', DOCUMENT_PREVIEW_LENGTH))
+        self._compress(ChatMessage._get_collection(), 'message', dry_run)
+        self._compress(SummaryCacheEntry._get_collection(), 'summary', dry_run)
+        self._compress(ExtractionCacheEntry._get_collection(), 'text', dry_run)
+        self._compress(versions_collection(), 'content', dry_run)
+        if dry_run:
+            self.stdout.write("Dry run: nothing was written")
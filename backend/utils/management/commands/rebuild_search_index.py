@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from document_summarizer.models import DocumentSession
+from document_summarizer.text_store import read_full_text
+from documents.mongo_client import conversations_collection, get_latest_document
+from utils.search import index_document, CONVERSATION, SESSION
+
+
+class Command(BaseCommand):
+    help = "Index every conversation and document session for search (saves keep the index up to date afterwards)."
+
+    def handle(self, *args, **options):
+        conversations = 0
+        for conversation in conversations_collection().find({'owner_id': {'$ne': None}}, {'title': 1, 'owner_id': 1}):
+            latest = get_latest_document(conversation['_id'])
+            index_document(
+                CONVERSATION, conversation['_id'], conversation['owner_id'],
+                title=conversation.get('title') or '', content=latest['content'] if latest else '',
+            )
+            conversations += 1
+
+        sessions = 0
+        for session in DocumentSession.objects.only('user', 'summary', 'text_storage', 'document_text').no_dereference():
+            index_document(SESSION, session.id, session.user.id, summary=session.summary, content=read_full_text(session))
+            sessions += 1
+        self.stdout.write(f"Indexed {conversations} conversation(s) and {sessions} session(s)")
@@ -0,0 +1,99 @@
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_summarizer.models import DocumentSession, ChatMessage
+from documents.mongo_client import versions_collection
+from utils.compression import compress_text, decode_text, dictionary_id, zstandard, DICTIONARY_SUFFIX
+
+# zlib only looks back this far, so a longer dictionary is wasted
+ZLIB_MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+def _zlib_dictionary(samples, size):
+    """The lines shared by most samples, most frequent last, where zlib finds them cheapest."""
+    counts = Counter()
+    for sample in samples:
+        counts.update({line.strip() for line in sample.splitlines() if len(line.strip()) >= 20})
+    shared = [line for line, count in counts.most_common() if count > 1]
+    chosen, total = [], 0
+    for line in shared:
+        length = len(line.encode('utf-8')) + 1
+        if total + length > size:
+            break
+        chosen.append(line)
+        total += length
+    return "\n".join(reversed(chosen)).encode('utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a shared compression dictionary on stored legal text (or a directory of "
+        "text files) and report the compression ratio with and without it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True,
+                            help='File to write the dictionary to, or a directory such as '
+                                 'COMPRESSION_DICTIONARY_DIR to write it into as <id>.dict')
+        parser.add_argument('--source', help='Directory of .txt/.md files to train on instead of the database')
+        parser.add_argument('--samples', type=int, default=2000, help='Maximum number of samples to read')
+        parser.add_argument('--size', type=int, default=64 * 1024, help='Dictionary size in bytes')
+
+    def _samples(self, options):
+        limit = options['samples']
+        if options['source']:
+            samples = []
+            for filename in sorted(os.listdir(options['source']))[:limit]:
+                if filename.endswith(('.txt', '.md')):
+                    with open(os.path.join(options['source'], filename), encoding='utf-8') as f:
+                        samples.append(f.read())
+            return samples
+
+        samples = [
+            decode_text(version['content'])
+            for version in versions_collection().find({'content': {'$exists': True}}, {'content': 1}).limit(limit // 2)
+        ]
+        samples += [session.summary for session in DocumentSession.objects.only('summary').limit(limit // 4)]
+        samples += [message.message for message in ChatMessage.objects(is_user=False).only('message').limit(limit // 4)]
+        return [sample for sample in samples if sample]
+
+    def handle(self, *args, **options):
+        samples = self._samples(options)
+        if len(samples) < 10:
+            raise CommandError(f"Need at least 10 samples to train on, found {len(samples)}")
+
+        # Every tenth sample is held out to measure the ratio
+        held_out = samples[::10]
+        training = [sample for i, sample in enumerate(samples) if i % 10]
+        if zstandard is not None:
+            data = zstandard.train_dictionary(options['size'], [sample.encode('utf-8') for sample in training]).as_bytes()
+        else:
+            data = _zlib_dictionary(training, min(options['size'], ZLIB_MAX_DICTIONARY_SIZE))
+        dictionary = (dictionary_id(data), data)
+
+        output = options['output']
+        into_directory = os.path.isdir(output)
+        if into_directory:
+            output = os.path.join(output, f"{dictionary[0]:08x}{DICTIONARY_SUFFIX}")
+        # Values compressed with a dictionary can only be read back with it,
+        # so an existing one is never replaced
+        try:
+            with open(output, 'xb') as f:
+                f.write(data)
+        except FileExistsError:
+            raise CommandError(f"{output} already exists; dictionaries in use must never be overwritten")
+
+        raw = sum(len(sample.encode('utf-8')) for sample in held_out)
+        plain = sum(len(compress_text(sample, dictionary=False)) for sample in held_out)
+        primed = sum(len(compress_text(sample, dictionary=dictionary)) for sample in held_out)
+        self.stdout.write(
+            f"Wrote {len(data)} byte {'zstd' if zstandard is not None else 'zlib'} dictionary "
+            f"{dictionary[0]:08x} to {output} from {len(training)} samples"
+        )
+        self.stdout.write(
+            f"Held-out samples: {raw / plain:.1f}x without the dictionary, {raw / primed:.1f}x with it"
+        )
+        if into_directory:
+            self.stdout.write("Running processes keep compressing with their current dictionary until restarted")
@@ -0,0 +1,39 @@
+"""
+Keyset pagination shared by the listing endpoints.
+
+Lists are ordered newest first on (created_at, _id); a page ends with an
+opaque cursor for its last item, which the client sends back as ?before=
+for the next page. Listing endpoints return the page as their usual body
+and the cursor of the next page in the X-Next-Cursor header, left out on
+the last page.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class InvalidCursor(ValueError):
+    """Raised for a pagination cursor that was not produced by encode_cursor."""
+
+
+def encode_cursor(created_at, object_id):
+    """Opaque keyset cursor for a (created_at, _id) position."""
+    return f"{created_at.isoformat()}_{object_id}"
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, object_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def set_next_cursor(response, next_cursor):
+    """Send the cursor of the next page with a listing response, if there is one."""
+    if next_cursor:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    return response
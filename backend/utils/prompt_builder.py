@@ -0,0 +1,105 @@
+"""
+Token-budgeted prompt assembly.
+
+A prompt is described as named sections, each with a priority. When the
+sections together exceed the token budget, the lowest-priority sections
+are trimmed first: multi-item sections (passages, history messages) lose
+whole items from their trim side, single texts are cut (or dropped, for
+sections added with cut=False). Sections with trim=None (instructions,
+the user's question) are never trimmed.
+
+Token counts are estimated locally at CHARS_PER_TOKEN characters per
+token, which is close enough for English legal text with Gemini models.
+"""
+import math
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class PromptSection:
+    def __init__(self, name, items, priority, trim, separator, cut):
+        self.name = name
+        self.items = list(items)
+        self.priority = priority
+        self.trim = trim  # 'end' keeps the beginning, 'start' keeps the end, None keeps everything
+        self.separator = separator
+        self.cut = cut
+
+    @property
+    def tokens(self):
+        if not self.items:
+            return 0
+        return sum(estimate_tokens(item) for item in self.items) + estimate_tokens(self.separator) * (len(self.items) - 1)
+
+    def shrink(self, excess):
+        """Remove at least `excess` tokens, or everything; returns the tokens removed."""
+        before = self.tokens
+        if len(self.items) > 1 or not self.cut:
+            self.items.pop(0 if self.trim == 'start' else -1)
+        else:
+            item = self.items[0]
+            keep = max(0, len(item) - excess * CHARS_PER_TOKEN)
+            if keep == 0:
+                self.items = []
+            else:
+                self.items = [item[-keep:] if self.trim == 'start' else item[:keep]]
+        return before - self.tokens
+
+    @property
+    def text(self):
+        return self.separator.join(self.items)
+
+
+class BuiltPrompt:
+    def __init__(self, sections, budget):
+        self._sections = {section.name: section for section in sections}
+        self.budget = budget
+        self.tokens = sum(section.tokens for section in sections)
+
+    def text(self, name):
+        """The kept text of a section, items joined with its separator."""
+        return self._sections[name].text
+
+    def items(self, name):
+        """The kept items of a section."""
+        return list(self._sections[name].items)
+
+    def report(self):
+        return {
+            'prompt_tokens': self.tokens,
+            'budget': self.budget,
+            'sections': {name: section.tokens for name, section in self._sections.items()},
+        }
+
+
+class PromptBuilder:
+    """Collects prompt sections and trims them to a token budget."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._sections = []
+
+    def add(self, name, content, priority=0, trim='end', separator="\n\n", cut=True):
+        """
+        Add a section. content is a string or a list of items; trim is
+        'end', 'start' or None for sections that must be kept whole, and
+        cut=False keeps items whole, dropping them instead of cutting.
+        """
+        items = content if isinstance(content, (list, tuple)) else [content]
+        self._sections.append(PromptSection(name, [item for item in items if item], priority, trim, separator, cut))
+        return self
+
+    def build(self):
+        total = sum(section.tokens for section in self._sections)
+        trimmable = sorted(
+            (section for section in self._sections if section.trim),
+            key=lambda section: section.priority,
+        )
+        for section in trimmable:
+            while total > self.budget and section.items:
+                total -= section.shrink(total - self.budget)
+        return BuiltPrompt(self._sections, self.budget)
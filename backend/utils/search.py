@@ -0,0 +1,136 @@
+"""
+Full-text search over a user's conversations and summarized documents.
+
+Every conversation and DocumentSession has one entry in the
+search_documents collection (title, summary and the latest text), kept up
+to date by the code that saves them. Entries are searched with a MongoDB
+text index whose first key is owner_id, so a query only reads the index
+entries of its user; results are ranked by text score and come with a
+snippet around the first match and the offsets of the matched words.
+"""
+import re
+from datetime import datetime
+
+from django.conf import settings
+
+from legal_doc_generator.mongo import get_database
+
+CONVERSATION = 'conversation'
+SESSION = 'session'
+
+WORD = re.compile(r"\w+")
+# Highlighting only: the text index itself drops MongoDB's full stop word list
+STOP_WORDS = {'the', 'and', 'for', 'with', 'that', 'this', 'from', 'are', 'was', 'not', 'but', 'any', 'all', 'its', 'of', 'to', 'in', 'on', 'or', 'by', 'an', 'at', 'as', 'is', 'be'}
+# The text index matches stems ("indemnity" finds "indemnification"), so
+# matches are highlighted by the leading characters of each query word
+HIGHLIGHT_PREFIX = 6
+_indexes_created = False
+
+
+def search_collection():
+    global _indexes_created
+    collection = get_database()['search_documents']
+    if not _indexes_created:
+        collection.create_index([('kind', 1), ('source_id', 1)], unique=True)
+        collection.create_index(
+            [('owner_id', 1), ('title', 'text'), ('summary', 'text'), ('content', 'text')],
+            weights={'title': 10, 'summary': 5, 'content': 1},
+            default_language='english',
+            name='owner_text',
+        )
+        _indexes_created = True
+    return collection
+
+
+def index_document(kind, source_id, owner_id, title=None, summary=None, content=None):
+    """
+    Add or update the search entry of a conversation or session. Fields left
+    as None keep their indexed value. Never raises: a failed update only
+    leaves search results behind until the next save.
+    """
+    if owner_id is None:
+        return
+    fields = {'owner_id': owner_id, 'updated_at': datetime.utcnow()}
+    if title is not None:
+        fields['title'] = title
+    if summary is not None:
+        fields['summary'] = summary
+    if content is not None:
+        fields['content'] = content[:settings.SEARCH_MAX_INDEXED_CHARS]
+    try:
+        search_collection().update_one(
+            {'kind': kind, 'source_id': str(source_id)}, {'$set': fields}, upsert=True
+        )
+    except Exception as e:
+        print(f"Error indexing {kind} {source_id} for search: {e}")
+
+
+def remove_document(kind, source_id):
+    try:
+        search_collection().delete_one({'kind': kind, 'source_id': str(source_id)})
+    except Exception as e:
+        print(f"Error removing {kind} {source_id} from search: {e}")
+
+
+def _snippet(text, pattern):
+    """A window of text around its first match of pattern, and the [start, end) offsets of the matches in it."""
+    match = pattern.search(text)
+    if not match:
+        return None
+    length = settings.SEARCH_SNIPPET_LENGTH
+    start = max(0, match.start() - length // 3)
+    end = min(len(text), start + length)
+    # Do not cut words at the edges of the window
+    if start > 0:
+        space = text.find(' ', start, match.start())
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(' ', match.end(), end)
+        end = space if space != -1 else end
+    snippet = ('...' if start > 0 else '') + text[start:end] + ('...' if end < len(text) else '')
+    return {
+        'text': snippet,
+        'highlights': [[found.start(), found.end()] for found in pattern.finditer(snippet)],
+    }
+
+
+def search(owner_id, query, kind=None, limit=20):
+    """
+    The user's conversations and sessions matching query, best first, as
+    dicts with the kind, source id, title, score and a snippet.
+    """
+    if not WORD.search(query):
+        return []
+    terms = sorted({term[:HIGHLIGHT_PREFIX] for term in WORD.findall(query.lower()) if term not in STOP_WORDS})
+    pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\w*", re.IGNORECASE) if terms else None
+
+    filters = {'owner_id': owner_id, '$text': {'$search': query}}
+    if kind:
+        filters['kind'] = kind
+    entries = (
+        search_collection()
+        .find(filters, {
+            'kind': 1, 'source_id': 1, 'title': 1, 'summary': 1, 'content': 1, 'updated_at': 1,
+            'score': {'$meta': 'textScore'},
+        })
+        .sort([('score', {'$meta': 'textScore'})])
+        .limit(limit)
+    )
+
+    results = []
+    for entry in entries:
+        snippet = None
+        for field in ('content', 'summary', 'title') if pattern else ():
+            snippet = _snippet(entry.get(field) or '', pattern)
+            if snippet:
+                snippet['field'] = field
+                break
+        results.append({
+            'kind': entry['kind'],
+            'id': entry['source_id'],
+            'title': entry.get('title') or '',
+            'score': round(entry['score'], 3),
+            'updated_at': entry.get('updated_at'),
+            'snippet': snippet,
+        })
+    return results
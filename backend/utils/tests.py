@@ -1,3 +1,94 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import compression
+from .compression import compress_text, decompress_text, encode_text, decode_text, dictionary_id
+
+TEXT = "".join(
+    f"{number}. The Tenant shall pay the Rent on the first day of each month without deduction.\n"
+    for number in range(1, 60)
+)
+DICTIONARY = b"The Tenant shall pay the Rent on the first day of each month without deduction.\n" * 8
+
+
+class CompressionTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(COMPRESSION_DICTIONARY_DIR=self.directory.name, COMPRESSION_MIN_SIZE=512)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Dictionaries are loaded once per process; start and end each test without them
+        compression._dictionaries = None
+        self.addCleanup(setattr, compression, '_dictionaries', None)
+
+    def _add_dictionary(self, data):
+        path = os.path.join(self.directory.name, f"{dictionary_id(data):08x}{compression.DICTIONARY_SUFFIX}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        compression._dictionaries = None
+        return path
+
+    def test_zlib_round_trip(self):
+        with mock.patch.object(compression, 'zstandard', None):
+            blob = compress_text(TEXT)
+        self.assertEqual(blob[:1], compression.ZLIB)
+        self.assertEqual(decompress_text(blob), TEXT)
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        blob = compress_text(TEXT)
+        self.assertEqual(blob[:1], compression.ZSTD)
+        self.assertEqual(decompress_text(blob), TEXT)
+
+    def test_zlib_dictionary_round_trip(self):
+        self._add_dictionary(DICTIONARY)
+        with mock.patch.object(compression, 'zstandard', None):
+            blob = compress_text(TEXT)
+            plain = compress_text(TEXT, dictionary=False)
+        self.assertEqual(blob[:1], compression.ZLIB_DICTIONARY)
+        self.assertLess(len(blob), len(plain))
+        self.assertEqual(decompress_text(blob), TEXT)
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd_dictionary_round_trip(self):
+        self._add_dictionary(DICTIONARY)
+        blob = compress_text(TEXT)
+        self.assertEqual(blob[:1], compression.ZSTD_DICTIONARY)
+        self.assertEqual(decompress_text(blob), TEXT)
+
+    def test_older_dictionaries_stay_readable(self):
+        self._add_dictionary(DICTIONARY)
+        old = compress_text(TEXT)
+        # Make sure the new file is the newest even on coarse mtime resolution
+        newer = self._add_dictionary(b"The Landlord shall keep the structure in repair.\n" * 8)
+        os.utime(newer, (time.time() + 10, time.time() + 10))
+        new = compress_text(TEXT)
+        self.assertNotEqual(old[1:5], new[1:5])
+        self.assertEqual(decompress_text(old), TEXT)
+        self.assertEqual(decompress_text(new), TEXT)
+
+    def test_missing_dictionary_is_an_error(self):
+        path = self._add_dictionary(DICTIONARY)
+        blob = compress_text(TEXT)
+        os.remove(path)
+        compression._dictionaries = None
+        with self.assertRaisesMessage(RuntimeError, f"{dictionary_id(DICTIONARY):08x}"):
+            decompress_text(blob)
+
+    def test_unknown_tag_is_an_error(self):
+        with self.assertRaises(ValueError):
+            decompress_text(b"?data")
+
+    def test_encode_text_threshold(self):
+        short = TEXT[:511]
+        self.assertEqual(encode_text(short), short)
+        encoded = encode_text(TEXT)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(decode_text(encoded), TEXT)
+        self.assertEqual(decode_text(short), short)
@@ -6,4 +6,7 @@ urlpatterns = [
     path('upload-signature/', views.upload_signature, name='upload-signature'),
     path('conversations/<str:pk>/download-latest-pdf/', views.download_latest_conversation_pdf, name='download-latest-conversation-pdf'),
     path('conversations/<str:pk>/versions/<int:version_number>/download-pdf/', views.download_version_pdf, name='download-version-pdf'),
+    path('llm-metrics/', views.llm_metrics, name='llm-metrics'),
+    path('search/', views.search_documents, name='search-documents'),
+    path('db-pool-stats/', views.db_pool_stats, name='db-pool-stats'),
 ]
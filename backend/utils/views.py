@@ -1,4 +1,5 @@
-from rest_framework.decorators import api_view, parser_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from django.http import FileResponse
 import markdown
@@ -7,7 +8,13 @@ from io import BytesIO
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 import cloudinary.uploader
-from documents.mongo_client import get_conversation_by_id
+from documents.mongo_client import get_conversation_by_id, get_latest_document, get_document_version_content, owns_conversation
+from utils.llm_gateway import latency_metrics
+from legal_doc_generator.mongo import pool_stats
+from utils.search import search, CONVERSATION, SESSION
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
 
 
 @api_view(['POST'])
@@ -180,17 +187,18 @@ def download_latest_conversation_pdf(request, pk):
     """
     Downloads the latest document content from a conversation as a PDF.
     """
-    conversation = get_conversation_by_id(pk)
-    if not conversation or 'document_versions' not in conversation or not conversation['document_versions']:
+    # Another user's conversation answers 404, as in the documents app
+    if not owns_conversation(pk, request.user.id, request.user.username):
+        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    latest = get_latest_document(pk)
+    if not latest:
         return Response({'error': 'No document content found for this conversation.'}, status=status.HTTP_404_NOT_FOUND)
 
     try:
-        # Get the content of the latest version
-        latest_version_content = conversation['document_versions'][-1]['content']
-        pdf_file = _generate_pdf_from_markdown(latest_version_content)
+        pdf_file = _generate_pdf_from_markdown(latest['content'])
         
         response = FileResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{conversation.get("title", "legal_document")}.pdf"'
+        response['Content-Disposition'] = f'attachment; filename="{latest.get("title") or "legal_document"}.pdf"'
         return response
     except Exception as e:
         return Response({'error': f'Error generating PDF: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -201,15 +209,17 @@ def download_version_pdf(request, pk, version_number):
     Downloads a specific document version from a conversation as a PDF.
     """
     try:
-        conversation = get_conversation_by_id(pk)
-        if not conversation or 'document_versions' not in conversation or not conversation['document_versions']:
+        if not owns_conversation(pk, request.user.id, request.user.username):
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        conversation = get_conversation_by_id(pk, versions=False)
+        if not conversation:
             return Response({'error': 'No document versions found for this conversation.'}, status=status.HTTP_404_NOT_FOUND)
         
-        version = next((v for v in conversation['document_versions'] if v['version_number'] == version_number), None)
-        if not version:
+        content = get_document_version_content(pk, version_number)
+        if content is None:
             return Response({'error': 'Version content not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        pdf_file = _generate_pdf_from_markdown(version['content'])
+        pdf_file = _generate_pdf_from_markdown(content)
         filename = f"{conversation.get("title", "legal_document")}_v{version_number}.pdf"
         
         response = FileResponse(pdf_file, content_type='application/pdf')
@@ -217,4 +227,48 @@ def download_version_pdf(request, pk, version_number):
         return response
     except Exception as e:
         print(f"Error in download_version_pdf: {e}")
-        return Response({'error': f'Error generating PDF: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': f'Error generating PDF: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def llm_metrics(request):
+    """
+    Per-call latency and error metrics of the shared LLM gateway for this worker process.
+    """
+    return Response({'metrics': latency_metrics()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    """
+    Connection pool counters of the shared MongoDB client for this worker process.
+    """
+    return Response({'pool': pool_stats()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def search_documents(request):
+    """
+    Searches the user's conversations and summarized documents with ?q=,
+    optionally only one ?kind= (conversation or session), best matches first.
+    """
+    query = request.query_params.get('q', '').strip()
+    kind = request.query_params.get('kind')
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if kind and kind not in (CONVERSATION, SESSION):
+        return Response({'error': f'kind must be {CONVERSATION} or {SESSION}'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(int(request.query_params.get('limit', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return Response({'error': 'limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = search(request.user.id, query, kind=kind, limit=limit)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+    except Exception as e:
+        print(f"Error in search_documents: {e}")
+        return Response({'error': f'Error searching documents: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)